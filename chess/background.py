@@ -0,0 +1,131 @@
+"""
+Runs the search in a separate process, so the window keeps drawing and answering events while the engine
+thinks. The process keeps its Searcher, and with it the transposition table, for the whole game. It also
+opens the opening book, compiling it first when it's missing or out of date, so the window never waits on that.
+"""
+import multiprocessing
+import queue
+import traceback
+import chess as ch
+from book import OpeningBook
+from constants import PROFILE, TT_SIZE_MB
+from profiling import profiled
+from searcher import Searcher, SearchResult
+
+
+def searchLoop(ttSizeMb: int, tasks: multiprocessing.Queue, results: multiprocessing.Queue, stopEvent) -> None:
+    """
+    searchLoop runs in the search process. It searches the positions sent on tasks until it gets None, and
+    sends ("info", SearchResult) after every completed depth and ("done", SearchResult) at the end on results.
+    Book lookups are answered with ("book", move), a move of None once the position is out of the book.
+    """
+    searcher = Searcher(ttSizeMb)
+    book = OpeningBook()
+    try:
+        book.open()
+    except Exception:
+        # the engine can play without its book
+        traceback.print_exc()
+    while True:
+        task = tasks.get()
+        if task == None:
+            break
+        command, fen, limits = task
+        if command == "newGame":
+            searcher.newGame()
+            continue
+        if command == "book":
+            try:
+                move = book.chooseMove(ch.Board(fen))
+            except Exception:
+                traceback.print_exc()
+                move = None
+            results.put(("book", move))
+            continue
+        try:
+            with profiled(PROFILE):
+                result = searcher.search(fen, stopEvent=stopEvent, onIteration=lambda info: results.put(("info", info)),
+                                         **limits)
+        except Exception:
+            # still answer with a legal move, so the window isn't left waiting, and keep the process for the next search
+            traceback.print_exc()
+            result = SearchResult(next(iter(ch.Board(fen).legal_moves), None), None, [], 0, 0, 0, "")
+        results.put(("done", result))
+
+
+class BackgroundSearcher():
+    """
+    BackgroundSearcher searches in a process of its own. start a search, then poll for its progress
+    and result without blocking. Close it when the game is over.
+    """
+    def __init__(self, ttSizeMb: int = TT_SIZE_MB) -> None:
+        self.tasks = multiprocessing.Queue()
+        self.results = multiprocessing.Queue()
+        self.stopEvent = multiprocessing.Event()
+        self.process = multiprocessing.Process(target=searchLoop, args=(ttSizeMb, self.tasks, self.results, self.stopEvent),
+                                               daemon=True)
+        self.process.start()
+        self.searching = False
+
+    def start(self, position: ch.Board | str, **limits) -> None:
+        """
+        start searches position (a chess.Board or fen) with the limits Searcher.search takes
+        (depth, moveTime, remaining, increment, ...).
+        """
+        fen = position if isinstance(position, str) else position.fen()
+        self.stopEvent.clear()
+        self.searching = True
+        self.tasks.put(("search", fen, limits))
+
+    def bookMove(self, position: ch.Board | str) -> None:
+        """
+        bookMove looks up a move of the opening book for position. poll gives it as a ("book", move) message.
+        """
+        fen = position if isinstance(position, str) else position.fen()
+        self.searching = True
+        self.tasks.put(("book", fen, None))
+
+    def poll(self) -> list[tuple[str, SearchResult]]:
+        """
+        poll gives the ("info", result), ("done", result) and ("book", move) messages sent since the last poll.
+        """
+        messages = []
+        while True:
+            try:
+                message = self.results.get_nowait()
+            except queue.Empty:
+                return messages
+            if message[0] != "info":
+                self.searching = False
+            messages.append(message)
+
+    def stop(self) -> SearchResult | None:
+        """
+        stop ends the running search and gives its result, the best move of the last completed depth.
+        A book lookup isn't a search, stopping it gives None.
+        """
+        if not self.searching:
+            return None
+        self.stopEvent.set()
+        while True:
+            kind, result = self.results.get()
+            if kind == "book":
+                self.searching = False
+                return None
+            if kind == "done":
+                self.searching = False
+                return result
+
+    def newGame(self) -> None:
+        self.stop()
+        self.tasks.put(("newGame", None, None))
+
+    def close(self) -> None:
+        """
+        close stops the search and the process.
+        """
+        self.stopEvent.set()
+        self.tasks.put(None)
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
@@ -0,0 +1,133 @@
+"""
+Search benchmark: searches every position of bench.epd (middlegames and endgames from games.txt, and
+tactics) to a fixed depth with a fresh transposition table, and reports the nodes and speed.
+
+    python bench.py                        run, print the results
+    python bench.py --save base.json       run and keep the results
+    python bench.py --compare base.json    run and compare with a saved run
+    python bench.py --compare a.json b.json
+
+The signature is the total node count. The search has no randomness, so it only changes when the
+search itself does; a change that should only make the engine faster must keep it.
+Comparing exits with status 1 when the speed or the node count got worse by more than the threshold.
+"""
+import argparse
+import json
+import os
+import sys
+import chess as ch
+from searcher import Searcher
+
+BENCH_DEPTH = 4
+BENCH_TT_SIZE_MB = 16
+BENCH_POSITIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench.epd")
+
+
+def readPositions(path: str = BENCH_POSITIONS_PATH) -> list[tuple[ch.Board, dict]]:
+    """
+    readPositions gives the board and operations (id, bm, ...) of every line of the epd file at path.
+    """
+    positions = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                positions.append(ch.Board.from_epd(line))
+    return positions
+
+
+def runBench(depth: int = BENCH_DEPTH, ttSizeMb: int = BENCH_TT_SIZE_MB, path: str = BENCH_POSITIONS_PATH,
+             verbose: bool = True) -> dict:
+    """
+    runBench searches every position of path to depth and gives the results of the run.
+    """
+    results = []
+    for board, operations in readPositions(path):
+        result = Searcher(ttSizeMb).search(board, depth=depth)
+        bestMoves = operations.get("bm")
+        solved = None if bestMoves == None else result.bestMove in bestMoves
+        results.append({"id": operations.get("id"), "nodes": result.nodes, "time": round(result.elapsed, 4),
+                        "move": result.bestMove.uci() if result.bestMove != None else None, "solved": solved})
+        if verbose:
+            print(f"{operations.get('id', ''):<24} {result.bestMove} {result.nodes:>9} nodes {result.elapsed:7.2f}s"
+                  + ("" if solved == None else "  solved" if solved else "  missed"))
+    nodes = sum(result["nodes"] for result in results)
+    elapsed = sum(result["time"] for result in results)
+    return {
+        "depth": depth,
+        "ttSizeMb": ttSizeMb,
+        "signature": nodes,
+        "time": round(elapsed, 4),
+        "nps": int(nodes / elapsed) if elapsed > 0 else 0,
+        "solved": sum(1 for result in results if result["solved"]),
+        "tactics": sum(1 for result in results if result["solved"] != None),
+        "positions": results,
+    }
+
+
+def printRun(run: dict) -> None:
+    print(f"depth {run['depth']}, {len(run['positions'])} positions, tactics solved {run['solved']}/{run['tactics']}")
+    print(f"Nodes searched  : {run['signature']} (signature)")
+    print(f"Time            : {run['time']:.2f}s")
+    print(f"Nodes/second    : {run['nps']}")
+
+
+def compareRuns(base: dict, new: dict, threshold: float) -> list[str]:
+    """
+    compareRuns prints how new differs from base and gives a message for each regression,
+    a drop in nodes per second or a rise in nodes of more than threshold percent.
+    """
+    regressions = []
+    speed = (new["nps"] - base["nps"]) / base["nps"] * 100 if base["nps"] else 0
+    print(f"nps {base['nps']} -> {new['nps']} ({speed:+.1f}%)")
+    if speed < -threshold:
+        regressions.append(f"nodes per second dropped {-speed:.1f}%")
+    if base["depth"] != new["depth"] or base["ttSizeMb"] != new["ttSizeMb"]:
+        print("runs were made at different depths or table sizes, node counts not compared")
+        return regressions
+    if base["signature"] == new["signature"]:
+        print(f"signature {new['signature']} unchanged")
+        return regressions
+    growth = (new["signature"] - base["signature"]) / base["signature"] * 100
+    print(f"signature {base['signature']} -> {new['signature']} ({growth:+.1f}%), the search changed")
+    if growth > threshold:
+        regressions.append(f"total nodes rose {growth:.1f}%")
+    baseNodes = {position["id"]: position["nodes"] for position in base["positions"]}
+    for position in new["positions"]:
+        before = baseNodes.get(position["id"])
+        if before and position["nodes"] != before:
+            print(f"  {position['id']:<24} {before:>9} -> {position['nodes']:>9}")
+    return regressions
+
+
+def loadRun(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search benchmark")
+    parser.add_argument("--depth", type=int, default=BENCH_DEPTH, help="depth to search each position to")
+    parser.add_argument("--tt-size", type=int, default=BENCH_TT_SIZE_MB, help="transposition table size in megabytes")
+    parser.add_argument("--positions", default=BENCH_POSITIONS_PATH, help="epd file of the positions to search")
+    parser.add_argument("--save", help="file to write the results of the run to")
+    parser.add_argument("--compare", nargs="+", metavar="RUN",
+                        help="saved run to compare this run with, or two saved runs to compare without running")
+    parser.add_argument("--threshold", type=float, default=5, help="percent worse that counts as a regression")
+    args = parser.parse_args()
+    if args.compare != None and len(args.compare) > 2:
+        parser.error("--compare takes one or two runs")
+
+    if args.compare != None and len(args.compare) == 2:
+        base, new = loadRun(args.compare[0]), loadRun(args.compare[1])
+    else:
+        new = runBench(args.depth, args.tt_size, args.positions)
+        printRun(new)
+        if args.save != None:
+            with open(args.save, "w", encoding="utf-8") as f:
+                json.dump(new, f, indent=1)
+        base = loadRun(args.compare[0]) if args.compare != None else None
+    if base != None:
+        regressions = compareRuns(base, new, args.threshold)
+        for regression in regressions:
+            print("REGRESSION:", regression)
+        sys.exit(1 if regressions else 0)
@@ -5,23 +5,32 @@ import chess
 import pygame
 from objects import *
 from controls import Dragger
+from textures import getTexture
+
+def legalDestinations(allMoves: list[chess.Move]) -> dict[str, set[str]]:
+    """
+    legalDestinations maps every square a piece can move from, such as e2, to the squares it can move to in
+    allMoves, which is a list containing every legal move of every piece. A promotion gives the square and
+    the piece, like e8q, the way it's written in uci.
+    """
+    destinations = {}
+    for move in allMoves:
+        start = chess.SQUARE_NAMES[move.from_square]
+        target = chess.SQUARE_NAMES[move.to_square]
+        if move.promotion:
+            target += chess.piece_symbol(move.promotion)
+        destinations.setdefault(start, set()).add(target)
+    return destinations
+
 
 def findLegalMoves(allMoves: list[chess.Move], currPos: str) -> set[str]:
     """
     Finds all legal moves of the piece at currPos which is a string representing 
     a square on the board, such as a8 using allMoves which is a list containing 
-    every legal move of every piece
+    every legal move of every piece. To look up more than one piece of a position, build
+    legalDestinations once instead.
     """
-    legalMoves = set()
-    for location in allMoves:
-        pos = str(location)[2:]
-        try:
-            # add move if it's legal
-            if (chess.Move.from_uci(currPos + pos) in allMoves):
-                legalMoves.add(pos)
-        except ch.InvalidMoveError:
-            pass
-    return legalMoves
+    return legalDestinations(allMoves).get(currPos, set())
 
 
 class Game():
@@ -70,13 +79,6 @@ class Game():
                 pass
             else:
                 col, row = (ord(pos[0]) - ord('a'), 8 - int(pos[1]))
-                if (currBoard[pos].islower()):
-                    color = "black"
-                else:
-                    color = "white"
-                moves = set()
-                piece = Piece(currBoard[pos], color, 0, moves)
-                img = pygame.image.load(piece.texture)
+                img = getTexture(currBoard[pos])
                 img_center = col * SQSIZE + SQSIZE // 2, row * SQSIZE + SQSIZE // 2
-                piece.texture_rect = img.get_rect(center=img_center)
-                surface.blit(img, piece.texture_rect)
\ No newline at end of file
+                surface.blit(img, img.get_rect(center=img_center))
\ No newline at end of file
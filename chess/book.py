@@ -0,0 +1,196 @@
+"""
+Opening book compiled from game records. Every position reached in the first BOOK_PLIES plies of a
+game is keyed by its zobrist hash, so transpositions into a known position are found too, and the book
+keeps how many games played each move from there.
+
+The book file is a header followed by fixed size records sorted by position key. It's read through
+mmap with a binary search, so opening it costs nothing whatever its size, and processes using the
+same book share its pages.
+"""
+import heapq
+import itertools
+import mmap
+import os
+import random
+import struct
+import tempfile
+from typing import Iterable, Iterator
+import chess as ch
+from constants import BOOK_PLIES
+from transposition import zobristHash, encodeMove, decodeMove
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+GAMES_PATH = os.path.join(DIRECTORY, "games.txt")
+BOOK_PATH = os.path.join(DIRECTORY, "games.book")
+
+BOOK_MAGIC = b"ACBOOK1\0"
+# magic, number of records
+BOOK_HEADER = struct.Struct('<8sQ')
+# position key, move, weight (share of the position's games, out of 65535), number of games
+BOOK_RECORD = struct.Struct('<QHHI')
+# position key, move, number of games, the records of the sorted runs compileBook merges
+RUN_RECORD = struct.Struct('<QHI')
+RUN_SIZE = 2000000  # (position, move) pairs counted in memory before they're sorted out to a temporary file
+
+
+def readGames(gamesPath: str) -> Iterator[list[str]]:
+    """
+    readGames gives the moves of every game in gamesPath, a file with one game per line in san notation.
+    """
+    with open(gamesPath, 'r') as f:
+        for line in f:
+            yield line.split()
+
+
+def countMoves(games: Iterable[list[str]], maxPlies: int) -> Iterator[dict[tuple[int, int]: int]]:
+    """
+    countMoves replays the first maxPlies moves of each game and counts the (position key, move) pairs
+    played. The counts are given back every RUN_SIZE pairs so they never outgrow memory.
+    """
+    counts = {}
+    for sanMoves in games:
+        pythonBoard = ch.Board()
+        for san in sanMoves[:maxPlies]:
+            try:
+                move = pythonBoard.parse_san(san)
+            except ValueError:
+                # end of the game (the result) or a broken record
+                break
+            record = (zobristHash(pythonBoard), encodeMove(move))
+            counts[record] = counts.get(record, 0) + 1
+            pythonBoard.push(move)
+        if len(counts) >= RUN_SIZE:
+            yield counts
+            counts = {}
+    yield counts
+
+
+def readRun(run) -> Iterator[tuple[int, int, int]]:
+    """
+    readRun gives back the (key, move, games) records of a sorted run written by compileBook.
+    """
+    run.seek(0)
+    while True:
+        chunk = run.read(RUN_RECORD.size * 4096)
+        if not chunk:
+            return
+        yield from RUN_RECORD.iter_unpack(chunk)
+
+
+def compileBook(games: Iterable[list[str]], bookPath: str, maxPlies: int = BOOK_PLIES) -> int:
+    """
+    compileBook writes the book of games (each game a list of san moves) to bookPath and returns the
+    number of records written. The counts are sorted in runs that are merged at the end, so the
+    number of games isn't limited by memory. The book is written to a temporary file that then replaces
+    bookPath, so processes that have the old book mapped keep reading it unchanged.
+    """
+    runs = []
+    for counts in countMoves(games, maxPlies):
+        run = tempfile.TemporaryFile()
+        run.write(b"".join(RUN_RECORD.pack(key, move, count) for (key, move), count in sorted(counts.items())))
+        runs.append(run)
+
+    records = 0
+    descriptor, temporaryPath = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(bookPath)), suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, 'wb') as f:
+            f.write(BOOK_HEADER.pack(BOOK_MAGIC, 0))
+            merged = heapq.merge(*[readRun(run) for run in runs])
+            for key, positionRecords in itertools.groupby(merged, key=lambda record: record[0]):
+                # a move can be in several runs, add them up
+                moves = {}
+                for _, move, count in positionRecords:
+                    moves[move] = moves.get(move, 0) + count
+                total = sum(moves.values())
+                f.write(b"".join(BOOK_RECORD.pack(key, move, max(1, count * 65535 // total), min(count, 0xFFFFFFFF))
+                                 for move, count in sorted(moves.items())))
+                records += len(moves)
+            f.seek(0)
+            f.write(BOOK_HEADER.pack(BOOK_MAGIC, records))
+        os.replace(temporaryPath, bookPath)
+    except BaseException:
+        os.remove(temporaryPath)
+        raise
+    finally:
+        for run in runs:
+            run.close()
+    return records
+
+
+class OpeningBook():
+    """
+    Index of the opening moves played from each position. The book file is only opened on the
+    first lookup. When gamesPath is given, the book is compiled again from it if it's missing or out of date.
+    """
+    def __init__(self, bookPath: str = BOOK_PATH, gamesPath: str | None = GAMES_PATH) -> None:
+        self.bookPath = bookPath
+        self.gamesPath = gamesPath
+        self.file = None
+        self.map = None
+        self.records = 0
+
+    def isStale(self) -> bool:
+        """
+        isStale checks if the book file has to be compiled again from the games file.
+        """
+        if self.gamesPath == None:
+            return False
+        if not os.path.exists(self.bookPath) or os.path.getmtime(self.bookPath) < os.path.getmtime(self.gamesPath):
+            return True
+        with open(self.bookPath, 'rb') as f:
+            header = f.read(BOOK_HEADER.size)
+        return len(header) < BOOK_HEADER.size or BOOK_HEADER.unpack(header)[0] != BOOK_MAGIC
+
+    def open(self) -> None:
+        """
+        open maps the book file in memory, compiling it first if needed.
+        """
+        if self.isStale():
+            compileBook(readGames(self.gamesPath), self.bookPath)
+        self.file = open(self.bookPath, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.records = BOOK_HEADER.unpack_from(self.map, 0)
+        if magic != BOOK_MAGIC:
+            raise ValueError(f"{self.bookPath} is not an opening book")
+
+    def close(self) -> None:
+        if self.map != None:
+            self.map.close()
+            self.file.close()
+            self.map = None
+            self.file = None
+
+    def lookup(self, pythonBoard: ch.Board) -> list[tuple[ch.Move, int, int]]:
+        """
+        lookup gives every book move of the position on pythonBoard with its weight and the number of games that played it.
+        """
+        if self.map == None:
+            self.open()
+        key = zobristHash(pythonBoard)
+        bookMap = self.map
+        # binary search for the first record of the position
+        low, high = 0, self.records
+        while low < high:
+            middle = (low + high) // 2
+            if struct.unpack_from('<Q', bookMap, BOOK_HEADER.size + middle * BOOK_RECORD.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        for index in range(low, self.records):
+            recordKey, move, weight, games = BOOK_RECORD.unpack_from(bookMap, BOOK_HEADER.size + index * BOOK_RECORD.size)
+            if recordKey != key:
+                break
+            entries.append((decodeMove(move), weight, games))
+        return entries
+
+    def chooseMove(self, pythonBoard: ch.Board) -> ch.Move | None:
+        """
+        chooseMove picks one of the book moves of the position, weighted by how often it was played.
+        Returns None once the position is out of the book.
+        """
+        entries = [(move, weight) for move, weight, games in self.lookup(pythonBoard) if pythonBoard.is_legal(move)]
+        if not entries:
+            return None
+        moves, weights = zip(*entries)
+        return random.choices(moves, weights=weights)[0]
@@ -6,11 +6,10 @@ import pygame
 import sys
 import time
 from constants import *
-from board import Game, findLegalMoves
+from board import Game, legalDestinations
 from objects import *
 from controls import Dragger
-from engine import Engine
-from collections import defaultdict
+from background import BackgroundSearcher
 
 def fenConverter(string: str) -> dict[str: str]:
     """
@@ -36,15 +35,6 @@ def fenConverter(string: str) -> dict[str: str]:
         prevNum = 0
     return piecePositions
 
-def findLenUntilSpace(object: str, start: int) -> int:
-    end = start
-    for i in range(start, len(object)):
-        if object[i] != ' ':
-            end = i
-        else:
-            break
-    return end
-
 def hasPiece(board: dict[str: str], pos: str) -> bool:
     """
         Returns true if the position has a piece, false otherwise 
@@ -55,6 +45,29 @@ def hasPiece(board: dict[str: str], pos: str) -> bool:
         return False
 
 
+class FrameTimer():
+    """
+    FrameTimer measures how long the frames of the game loop take, and prints the average and slowest
+    frame every every frames.
+    """
+    def __init__(self, every: int = 300) -> None:
+        self.every = every
+        self.frames = 0
+        self.total = 0
+        self.slowest = 0
+
+    def addFrame(self, elapsed: float) -> None:
+        self.frames += 1
+        self.total += elapsed
+        self.slowest = max(self.slowest, elapsed)
+        if self.frames == self.every:
+            print(f"frame time: {self.total / self.frames * 1000:.2f}ms average, {self.slowest * 1000:.2f}ms slowest "
+                  f"over {self.frames} frames")
+            self.frames = 0
+            self.total = 0
+            self.slowest = 0
+
+
 class MainWindow():
     """
     The MainWindow is the program that will create the chessboard.
@@ -62,204 +75,287 @@ class MainWindow():
     def __init__(self, board: chess.Board):
         self.board = board
         self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
-        self.whitePieces = 16
-        self.blackPieces = 16
-
-        self.whitePieceCount = {
-            'Q': 1,
-            'N': 2,
-            'B': 2,
-            'R': 2,
-            'P': 8
-        }
-        self.blackPieceCount = {
-            'q': 1,
-            'n': 2,
-            'b': 2,
-            'r': 2,
-            'p': 8
-        }
 
         self.sanStack = []
-        self.transpositions = defaultdict(lambda: [None, None])
-        self.prevDepthScores = defaultdict(lambda: None)
+        self.engine = BackgroundSearcher()  # searches and looks up the opening book in a process of its own
+        self.thinkStart = None  # time the engine started thinking about its move
+        self.pondering = False  # searching the position after the player's expected reply
+        self.ponderMove = None
+        self.ponderLimits = None
+        self.ponderResult = None
+        self.engineClock = ENGINE_CLOCK  # seconds left on the engine clock, None without a clock
+        self.frameTimer = FrameTimer() if SHOW_FRAME_TIME else None
+        self.clock = pygame.time.Clock()
+        self.openingEnd = False  # when True, stop looking through opening records
+        self.currBoard = fenConverter(self.board.board_fen())
+        self.destinations = None  # legal destinations of each square of the position, built on the first click
+        self.game = Game(self.currBoard, self.board, False, None, 0, 0, 0, 0)
+        # the squares never change, draw them once and copy them to the screen
+        self.boardSurface = pygame.Surface((WIDTH, HEIGHT))
+        self.game.showBoard(self.boardSurface)
         pygame.display.set_caption("Chess")
 
-    def startGame(self):
+    def squareRect(self, pos: str) -> pygame.Rect:
         """
-        startGame method is the loop that runs the chess game
+        squareRect gives the part of the screen the square pos, like e4, is drawn on.
         """
-        board = self.board 
-        dragging = False
-        draggedPiece = None
-        mouseX = 0
-        mouseY = 0
-        moveCount = 0  # number of moves of game
-        initialRow = 0  # initial row we're dragging from with mouse
-        initialCol = 0  # initial column we're dragging from with mouse
-        openingEnd = False  # when True, stop looking through opening records
-        # main game loop
-        while (self.board.is_checkmate() == False and self.board.is_stalemate() == False
-               and self.board.is_fivefold_repetition() == False):
-            self.currBoard = fenConverter(self.board.board_fen())
-            self.game = Game(self.currBoard, self.board, dragging, draggedPiece, mouseX, mouseY, initialRow, initialCol)
-            self.engine = Engine(self.currBoard, self.board, self.whitePieces, self.blackPieces, self.transpositions, self.prevDepthScores,
-                                 self.whitePieceCount, self.blackPieceCount)
-            dragger = self.game.dragger
-            game = self.game
-            game.showBoard(self.screen)
+        return pygame.Rect((ord(pos[0]) - ord('a')) * SQSIZE, (8 - int(pos[1])) * SQSIZE, SQSIZE, SQSIZE)
+
+    def redraw(self, rects: list[pygame.Rect]) -> None:
+        """
+        redraw draws the squares, pieces and dragged piece over rects, and only updates those parts of the display.
+        """
+        game = self.game
+        for rect in rects:
+            self.screen.set_clip(rect)
+            self.screen.blit(self.boardSurface, rect, rect)
             game.show_pieces(self.screen)
-            # if we drag a piece, show that we drag it
-            if (dragger.dragging):
-                dragger.updateBlit(self.screen)
-            for event in pygame.event.get():
+            if game.dragger.dragging:
+                game.dragger.updateBlit(self.screen)
+        self.screen.set_clip(None)
+        pygame.display.update(rects)
 
-                # event for exiting game
-                if (event.type == pygame.QUIT):
-                    pygame.quit()
-                    sys.exit()
+    def updatePosition(self) -> list[pygame.Rect]:
+        """
+        updatePosition brings the board shown up to date with self.board after a move and gives the
+        squares that changed.
+        """
+        newBoard = fenConverter(self.board.board_fen())
+        changed = [self.squareRect(pos) for pos in newBoard if newBoard[pos] != self.currBoard[pos]]
+        self.currBoard = newBoard
+        self.game.currBoard = newBoard
+        self.destinations = None
+        return changed
+
+    def handleEvent(self, event: pygame.event.Event) -> list[pygame.Rect]:
+        """
+        handleEvent picks up, drags and drops the pieces of the player, and gives the parts of the
+        screen that need to be drawn again.
+        """
+        game = self.game
+        dragger = game.dragger
+        # event for clicking piece
+        if (event.type == pygame.MOUSEBUTTONDOWN):
+            mouseX, mouseY = event.pos
+            dragger.mouseX = mouseX
+            dragger.mouseY = mouseY
+            clickedRow = str(8 - (dragger.mouseY // SQSIZE))
+            clickedCol = chr(dragger.mouseX // SQSIZE + ord('a'))
+            pos = clickedCol + clickedRow
 
-                if (board.turn):
-                    # event for clicking piece
-                    if (event.type == pygame.MOUSEBUTTONDOWN):
-                        mouseX, mouseY = event.pos
-                        dragger.mouseX = mouseX
-                        dragger.mouseY = mouseY
-                        clickedRow = str(8 - (dragger.mouseY // SQSIZE))
-                        clickedCol = chr(dragger.mouseX // SQSIZE + ord('a'))
-                        pos = clickedCol + clickedRow
+            # event for a square with a piece
+            if (hasPiece(self.currBoard, pos)):
+                name = self.currBoard[pos]
+                # if the piece name is lowercase, it's black
+                if (name.islower()):
+                    color = 'black'
+                else:
+                    color = 'white'
+                if self.destinations == None:
+                    self.destinations = legalDestinations(self.board.legal_moves)
+                dragger.piece = Piece(name, color, 0, self.destinations.get(pos, set()))
+                dragger.initialRow = clickedRow
+                dragger.initialCol = clickedCol
+                dragger.dragging = True
+                game.initialRow = clickedRow
+                game.initialCol = clickedCol
+                game.dragging = True
+                return [self.squareRect(pos), dragger.rect()]
+        # event for moving piece
+        elif (event.type == pygame.MOUSEMOTION):
+            # event if piece is getting dragged
+            if (dragger.dragging == True):
+                previous = dragger.rect()
+                dragger.mouseX, dragger.mouseY = event.pos
+                return [previous, dragger.rect()]
 
-                        # event for a square with a piece
-                        if (hasPiece(self.currBoard, pos)):
-                            name = self.currBoard[pos]
-                            # if the piece name is lowercase, it's black
-                            if (name.islower()):
-                                color = 'black'
-                            else:
-                                color = 'white'
-                            draggedPiece = Piece(name, color, 0, findLegalMoves(self.board.legal_moves, pos))
-                            dragger.piece = draggedPiece
-                            initialRow = clickedRow
-                            initialCol = clickedCol
-                            dragger.initialRow = clickedRow
-                            dragger.initialCol = initialCol
-                            dragging = True
-                            dragger.dragging = dragging
-                    # event for moving piece
-                    elif (event.type == pygame.MOUSEMOTION):
-                        # event if piece is getting dragged
-                        if (dragger.dragging == True):
-                            mouseX, mouseY = event.pos
-                            dragger.mouseX = mouseX
-                            dragger.mouseY = mouseY
-                            game.showBoard(self.screen)
-                            game.show_pieces(self.screen)
-                            dragger.updateBlit(self.screen)
+        # event for placing (releasing) piece
+        elif (event.type == pygame.MOUSEBUTTONUP and dragger.dragging == True):
+            mouseX, mouseY = event.pos
+            currRow = str(8 - (mouseY // SQSIZE))
+            currCol = chr(mouseX // SQSIZE + ord('a'))
+            square = currCol + currRow
+            start = dragger.initialCol + dragger.initialRow
+            if (currRow == '8' and self.currBoard[start] == 'P'):
+                square += 'q'
+            print(start)
+            dirty = [dragger.rect(), self.squareRect(start)]
+            # if the move made is valid, update the position
+            moved = square in dragger.piece.moves
+            if moved:
+                self.sanStack.append(self.board.san(ch.Move.from_uci(start + square)))
+                self.board.push(ch.Move.from_uci(start + square))
+            dragger.dragging = False
+            dragger.piece = None
+            game.dragging = False
+            if moved:
+                dirty += self.updatePosition()
+            return dirty
+        return []
 
-                    # event for placing (releasing) piece
-                    elif (event.type == pygame.MOUSEBUTTONUP):
-                        mouseX, mouseY = event.pos
-                        currRow = str(8 - (mouseY // SQSIZE))
-                        currCol = chr(mouseX // SQSIZE + ord('a'))
-                        square = currCol + currRow
-                        if (currRow == '8' and self.currBoard[dragger.initialCol + dragger.initialRow] == 'P'):
-                            square += 'q'
-                        print(dragger.initialCol + dragger.initialRow)
-                        # if there's a piece on the square and the move made is valid, update the position
-                        if (dragger.piece != None and square in dragger.piece.moves):
-                            name = self.currBoard[square[:2]]
-                            moveCount += 1
-                            if (name != '0'):
-                                self.blackPieces -= 1
-                                # check for what kind of black piece was captured
-                                self.blackPieceCount[name] -= 1
-                            self.sanStack.append(self.board.san(ch.Move.from_uci(dragger.initialCol + dragger.initialRow + square)))
-                            self.board.push(ch.Move.from_uci(dragger.initialCol + dragger.initialRow + square))
-                        game.showBoard(self.screen)
-                        game.show_pieces(self.screen)
+    def searchLimits(self) -> dict:
+        """
+        searchLimits gives the limits of the engine's search for its move.
+        """
+        # with a time control, search as deep as the time for this move allows
+        if MOVE_TIME != None:
+            return {"moveTime": MOVE_TIME}
+        elif self.engineClock != None:
+            return {"remaining": self.engineClock, "increment": ENGINE_INCREMENT}
+        return {"depth": DEPTH}
 
-                        dragging = False
-                        dragger.dragging = dragging
-                        draggedPiece = None
-                        dragger.piece = draggedPiece
-                else:
-                    stop = False
-                    # if we're still checking for openings
-                    if openingEnd == False:
-                        currPos = " ".join(self.sanStack)
-                        posLen = len(currPos)
-                        game.showBoard(self.screen)
-                        game.show_pieces(self.screen)
-                        with open('games.txt', 'r') as f:
-                            i = 0
-                            for line in f:
-                                i += 1
-                                # if we found a record from the file games.txt
-                                if (currPos == line[:posLen]):
-                                    end = findLenUntilSpace(line, posLen + 1)
-                                    # if the position was found, but has no other move in the record
-                                    if end == posLen + 1:
-                                        continue
-                                    self.sanStack.append(line[posLen + 1:end + 1])
-                                    move = self.board.parse_san(line[posLen + 1:end + 1])
-                                    # if there's a piece
-                                    if self.currBoard[move.uci()[2:]] != '0':
-                                        self.whitePieces -= 1
-                                    self.board.push(move)
-                                    self.currBoard = fenConverter(self.board.board_fen())
-                                    game.showBoard(self.screen)
-                                    game.show_pieces(self.screen)
-                                    print(self.sanStack)
-                                    stop = True
-                                    break
-                            # if we found an opening position, continue
-                            if stop:
-                                continue
-                            openingEnd = True
-                    else:
-                        start_time = time.time()
-                        bestMove = None
-                        for i in range(1, DEPTH + 1):
-                            self.engine = Engine(self.currBoard, self.board, self.whitePieces, self.blackPieces, self.transpositions, self.prevDepthScores,
-                                                 self.whitePieceCount, self.blackPieceCount)
-                            print(self.engine.search(i, False, float("-inf"), float("inf"), i))
-                            self.transpositions = self.engine.transpositions
-                            self.prevDepthScores = self.engine.prevDepthScores
-                            if self.engine.materialValue != None:
-                                bestMove = self.engine.moves[self.engine.materialValue]
-                            print(board.turn, bestMove)
-                        # print(self.engine.search(DEPTH, False, float("-inf"), float("inf"), DEPTH))
-                        # self.transpositions = self.engine.transpositions
-                        # bestMove = self.engine.moves[self.engine.materialValue]
-                        print(time.time() - start_time)
-                        self.prevDepthScores = defaultdict(lambda: None)
-                        # game has ended (engine can make no more moves)
-                        if bestMove == None:
-                            # print(board.outcome().winner)
-                            sys.exit()
-                        # if there's a piece
-                        if bestMove.uci()[-1].isnumeric() == False:
-                            moveName = bestMove.uci()[2:-1]
-                        else:
-                            moveName = bestMove.uci()[2:]
-                        name = self.currBoard[moveName]
-                        if (name != '0'):
-                            self.whitePieces -= 1
-                            # check for what kind of white piece was captured
-                            self.whitePieceCount[name] -= 1
-                        self.sanStack.append(self.board.san(bestMove))
-                        self.board.push(bestMove)
-                        print("done: ", self.engine.materialValue)
-                        self.currBoard = fenConverter(self.board.board_fen())
-                        game.showBoard(self.screen)
-                        game.show_pieces(self.screen)
+    def engineTurn(self) -> None:
+        """
+        engineTurn starts the engine's move in the background, and pollEngine plays it. While in the
+        opening, the move is looked up in the book first, and the search only starts once it's out of the book.
+        """
+        # if we're still checking for openings
+        if self.openingEnd == False:
+            self.engine.bookMove(self.board)
+            return
+        self.thinkStart = time.time()
+        self.engine.start(self.board, verbose=True, **self.searchLimits())
+
+    def startPonder(self, result) -> None:
+        """
+        startPonder searches the position after the reply the engine expects (the second move of its
+        principal variation) while the player thinks. With a fixed depth the search is the same one the
+        engine's turn would start, otherwise it goes on until the player moves, filling the transposition table.
+        """
+        if not PONDER or len(result.pv) < 2:
+            return
+        board = self.board.copy(stack=False)
+        board.push(result.pv[1])
+        if board.is_game_over():
+            return
+        self.ponderMove = result.pv[1]
+        self.ponderLimits = self.searchLimits()
+        self.ponderResult = None
+        self.pondering = True
+        if "depth" in self.ponderLimits:
+            self.engine.start(board, **self.ponderLimits)
+        else:
+            self.engine.start(board, depth=MAX_DEPTH)
+
+    def endPonder(self) -> list[pygame.Rect] | None:
+        """
+        endPonder is called once the player has moved. If they played the expected reply and the engine
+        searches to a fixed depth, the ponder search is the engine's search: its move is played if it's
+        done, or when it's done. Otherwise the ponder search is stopped and None is returned, the engine's
+        search starts over with the table it filled.
+        """
+        self.pondering = False
+        if self.board.peek() == self.ponderMove and self.ponderLimits == self.searchLimits() == {"depth": DEPTH}:
+            print("ponder hit")
+            self.thinkStart = time.time()
+            if self.ponderResult != None:
+                return self.playResult(self.ponderResult)
+            return []
+        self.engine.stop()
+        return None
+
+    def pollEngine(self) -> list[pygame.Rect]:
+        """
+        pollEngine shows the progress of the background search in the window title, and plays the
+        move once the search is done, or the book move. Gives the squares that changed.
+        """
+        for kind, result in self.engine.poll():
+            if kind == "book":
+                # if we found a book move for the position, play it, otherwise stop looking through the book
+                if result != None:
+                    self.sanStack.append(self.board.san(result))
+                    self.board.push(result)
+                    print(self.sanStack)
+                    return self.updatePosition()
+                self.openingEnd = True
+                self.engineTurn()
+            elif kind == "info":
+                thinking = f"pondering {self.ponderMove}" if self.pondering else "thinking"
+                pygame.display.set_caption(f"Chess - {thinking}: depth {result.depth}, best {result.bestMove}, "
+                                           f"score {result.score}")
+            elif self.pondering:
+                # done before the player moved, kept for a ponder hit
+                self.ponderResult = result
+            else:
+                return self.playResult(result)
+        return []
+
+    def playResult(self, result) -> list[pygame.Rect]:
+        """
+        playResult plays the move found by the engine's search, and starts pondering on the reply.
+        Gives the squares that changed.
+        """
+        pygame.display.set_caption("Chess")
+        bestMove = result.bestMove
+        print(time.time() - self.thinkStart)
+        if self.engineClock != None:
+            self.engineClock += ENGINE_INCREMENT - (time.time() - self.thinkStart)
+        print(result)
+        print(result.ttStats)
+        # game has ended (engine can make no more moves)
+        if bestMove == None:
+            # print(board.outcome().winner)
+            self.quit()
+        self.sanStack.append(self.board.san(bestMove))
+        self.board.push(bestMove)
+        print("done: ", result.score)
+        self.startPonder(result)
+        return self.updatePosition()
+
+    def quit(self) -> None:
+        """
+        quit cancels the engine's search and closes the window.
+        """
+        self.engine.close()
+        pygame.quit()
+        sys.exit()
+
+    def startGame(self):
+        """
+        startGame method is the loop that runs the chess game. It sleeps until there's an event, draws only
+        the parts of the screen that changed, and never more than FRAME_RATE times a second. While the engine
+        thinks in the background, the loop keeps going and checks for its move.
+        """
+        self.redraw([self.screen.get_rect()])
+        # main game loop
+        while (self.board.is_checkmate() == False and self.board.is_stalemate() == False
+               and self.board.is_fivefold_repetition() == False):
+            if not self.board.turn and self.pondering:
+                dirty = self.endPonder()
+                if dirty:
+                    self.redraw(dirty)
+                    continue
+            if not self.board.turn and not self.engine.searching:
+                self.engineTurn()
+            # while the engine thinks, wake up to check on it
+            if self.engine.searching:
+                events = [pygame.event.wait(1000 // FRAME_RATE)] + pygame.event.get()
+            else:
+                events = [pygame.event.wait()] + pygame.event.get()
+            frameStart = time.perf_counter()
+            dirty = []
+            for event in events:
+                # event for exiting game
+                if (event.type == pygame.QUIT):
+                    self.quit()
+                # the player only moves on their turn
+                if self.board.turn:
+                    dirty += self.handleEvent(event)
+            if self.engine.searching:
+                dirty += self.pollEngine()
+            if dirty:
+                self.redraw(dirty)
+                if self.frameTimer != None:
+                    self.frameTimer.addFrame(time.perf_counter() - frameStart)
+            self.clock.tick(FRAME_RATE)
+        self.engine.close()
+        print(self.board.outcome().winner)
 
-            pygame.display.update()
-        print(board.outcome().winner)
 
+if __name__ == "__main__":
+    newBoard = ch.Board()
+    # newBoard.set_board_fen("7k/b7/8/3q3P/3P4/2P5/8/7K")
+    # print(newBoard.is_checkmate())
+    window = MainWindow(newBoard)
+    window.startGame()
 
-newBoard = ch.Board()
-# newBoard.set_board_fen("7k/b7/8/3q3P/3P4/2P5/8/7K")
-# print(newBoard.is_checkmate())
-window = MainWindow(newBoard)
-window.startGame()
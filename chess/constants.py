@@ -3,4 +3,28 @@ HEIGHT = 800 # height of game screen
 ROWS = 8 # rows of board
 COLS = 8 # columns of board
 SQSIZE = WIDTH // COLS # length of a square from the chess board
-DEPTH = 3  # Depth of search engine
\ No newline at end of file
+DEPTH = 3  # Depth of search engine
+DEBUG_EVAL = False  # check the incremental evaluation against a full recompute at every leaf
+TT_SIZE_MB = 64  # size of the transposition table in megabytes
+BOOK_PLIES = 20  # number of plies of each game kept in the opening book
+MOVE_TIME = None  # seconds the engine spends on each move, None searches to DEPTH
+ENGINE_CLOCK = None  # seconds on the engine clock for the game, used when MOVE_TIME is None
+ENGINE_INCREMENT = 0  # seconds added to the engine clock after each of its moves
+MAX_DEPTH = 30  # deepest iteration of a timed search
+USE_PVS = True  # principal variation search, moves after the first are searched with a null window first
+USE_ASPIRATION = True  # search each depth with a window around the score of the last one
+ASPIRATION_WINDOW = 5  # half width of the first aspiration window, 10 is a pawn
+USE_NULL_MOVE = True  # null move pruning, skipped in check and with only pawns and a king left
+NULL_MOVE_REDUCTION = 2  # how much shallower the search after a null move is
+NULL_MOVE_MIN_DEPTH = 3  # depth left needed to try a null move
+USE_LMR = True  # late move reductions for quiet moves
+LMR_MOVES = 3  # moves searched at full depth before quiet moves are reduced
+LMR_MIN_DEPTH = 3  # depth left needed to reduce a move
+LMR_REDUCTION = 1  # plies taken off a reduced move
+STATS_PATH = None  # file the engine appends the statistics of each search to as JSON lines, None to not collect them
+PROFILE = None  # "cprofile", "sample" or "allocations" profiles every engine turn, see profiling.py
+PROFILE_DIR = "profiles"  # directory the profiles are written to
+SHOW_FRAME_TIME = False  # print how long the frames of the game loop take
+FRAME_RATE = 60  # most frames drawn per second
+PONDER = False  # keep searching on the player's time, on the reply the engine expects
+MATE = 9999999  # score of the side to move when it is checkmated, negated
@@ -1,5 +1,6 @@
 import pygame
 from constants import *
+from textures import getTexture
 
 class Dragger:
     """
@@ -14,13 +15,17 @@ class Dragger:
         self.dragging = dragging
         self.piece = piece
 
+    def rect(self) -> pygame.Rect:
+        """
+        rect gives the part of the screen the dragged piece covers.
+        """
+        return getTexture(self.piece.letter, "128").get_rect(center=(self.mouseX, self.mouseY))
+
     def updateBlit(self, surface) -> None:
         """
         updateBlit updates the image position of the piece and loads it in
         """
-        self.piece.set_texture(size=128)
-        texture = self.piece.texture
-        img = pygame.image.load(texture)
+        img = getTexture(self.piece.letter, "128")
         img_center = (self.mouseX, self.mouseY)
         self.piece.texture_rect = img.get_rect(center=img_center)
         surface.blit(img, self.piece.texture_rect)
@@ -1,9 +1,9 @@
-from objects import Piece
-from board import findLegalMoves
 import chess as ch
 from constants import *
-from collections import defaultdict
-from heatmaps import *
+import time
+from tables import (PIECE_SQUARE_TABLE, PIECE_INDEX, LATE_KING_INDEX, MVV_LVA, ORDER_VALUE, HASH_MOVE_SCORE,
+                    CAPTURE_SCORE, KILLER_SCORES, HISTORY_LIMIT, isLateGame)
+from transposition import TranspositionTable, EXACT, LOWER, UPPER, HASHER, ZOBRIST_PIECES, zobristHash
 
 def fenConverter(string: str) -> dict[str: str]:
     """
@@ -29,6 +29,46 @@ def fenConverter(string: str) -> dict[str: str]:
         prevNum = 0
     return piecePositions
 
+def boardArray(pythonBoard: ch.Board) -> list[str]:
+    """
+    boardArray builds a 64 slot list indexed like python-chess squares (a1 = 0, b1 = 1, ..., h8 = 63).
+    Each slot holds the fen letter of the piece on that square, or a 0 if the square is empty, the same
+    values fenConverter gives for each square name.
+    """
+    board = ['0'] * 64
+    for square, piece in pythonBoard.piece_map().items():
+        board[square] = piece.symbol()
+    return board
+
+class SearchTimeout(Exception):
+    """
+    Raised inside the search when the deadline of the move has passed.
+    """
+    pass
+
+def allocateTime(remaining: float, increment: float, movesToGo: int = 30) -> float:
+    """
+    allocateTime gives the seconds to spend on the next move with remaining seconds left on the clock
+    and increment seconds added after each move. The clock is split over movesToGo moves, most of the
+    increment is used too, and a safety margin is always left on the clock.
+    """
+    budget = remaining / movesToGo + increment * 0.8
+    return max(0.01, min(budget, remaining * 0.5, remaining - 0.05))
+
+def countPieces(pythonBoard: ch.Board) -> tuple[int, int, dict[str: int], dict[str: int]]:
+    """
+    countPieces gives the number of white and black pieces on pythonBoard and how many of each kind
+    (kings left out) there are, the counts Engine keeps up to date during the search.
+    """
+    whitePieceCount = {}
+    blackPieceCount = {}
+    for pieceType in (ch.QUEEN, ch.KNIGHT, ch.BISHOP, ch.ROOK, ch.PAWN):
+        whitePieceCount[ch.piece_symbol(pieceType).upper()] = len(pythonBoard.pieces(pieceType, ch.WHITE))
+        blackPieceCount[ch.piece_symbol(pieceType)] = len(pythonBoard.pieces(pieceType, ch.BLACK))
+    whitePieces = ch.popcount(pythonBoard.occupied_co[ch.WHITE])
+    blackPieces = ch.popcount(pythonBoard.occupied_co[ch.BLACK])
+    return whitePieces, blackPieces, whitePieceCount, blackPieceCount
+
 def findColor(name: str) -> str:
     """
     finColor finds the color of the piece with the name name.
@@ -41,103 +81,147 @@ def findColor(name: str) -> str:
         return "white"
 
 
+def ageHistory(history: list[int]) -> None:
+    """
+    ageHistory halves every history score, so moves that were good long ago count less than recent ones.
+    """
+    for index in range(len(history)):
+        history[index] >>= 1
+
+
 class Engine():
     """
     Class that controls the engine with the moves
     """
-    def __init__(self, board: dict[str: str], pythonBoard: ch.Board, whitePieces: int, blackPieces: int, transpositions: defaultdict, prevDepthScores: defaultdict,
+    def __init__(self, pythonBoard: ch.Board, whitePieces: int, blackPieces: int, transpositions: TranspositionTable,
                  whitePieceCount: dict[str: int], blackPieceCount: dict[str: int]) -> None:
-        self.board = board
         self.pythonBoard = pythonBoard
+        # mirror of pythonBoard, updated by makeMove and unmakeMove instead of being rebuilt from the fen
+        self.board = boardArray(pythonBoard)
+        self.undoStack = []
+        # material and map score of every piece but the kings, updated by makeMove and unmakeMove
+        self.score = self.scorePieces()
+        # zobrist hash of the pieces, the castling, en passant and turn parts are added in zobristKey
+        self.pieceHash = HASHER.hash_board(pythonBoard)
         self.materialValue = None
         self.transpositions = transpositions
         self.whitePieces = whitePieces
         self.blackPieces = blackPieces
-        self.prevDepthScores = prevDepthScores
         self.whitePieceCount = whitePieceCount
         self.blackPieceCount = blackPieceCount
         self.moves = {}
+        self.nodes = 0
+        self.deadline = None  # time.perf_counter() value at which the search is stopped
+        self.verbose = False  # print the moves and scores of each depth
+        self.stopEvent = None  # threading.Event another thread can set to stop the search
+        self.onIteration = None  # called with (depth, best move, score) after each completed depth
+        # two quiet moves that caused a cutoff at each ply, and cutoff scores of quiet moves by color, from and to square
+        self.killers = [[None, None] for ply in range(MAX_DEPTH + 4)]
+        self.history = [0] * 8192
+        self.usePvs = USE_PVS  # search the moves after the first with a null window
+        self.useAspiration = USE_ASPIRATION  # start each depth with a window around the last depth's score
+        self.useNullMove = USE_NULL_MOVE  # prune positions still above beta after passing the move
+        self.useLmr = USE_LMR  # search quiet moves ordered late to a lower depth
+        self.rootPly = 0  # length of undoStack at the root of the search
+        self.stats = None  # SearchStats counting what the search does, nothing is counted without one
 
-    def attackedByPawn(self, start: str, color: str) -> bool:
+    def attackedByPawn(self, start: int, color: str) -> bool:
         """
-        attackedByPawn detects if a piece at position start with the color color is attacked by a pawn.
+        attackedByPawn detects if a piece at the square index start with the color color is attacked by a pawn.
         A pinned pawn will not count as an attacker.
         """
+        file = ch.square_file(start)
+        rank = ch.square_rank(start)
         if color == "white":
-            left = ""
-            right = ""
             # check row
-            if start[1] != '8':
+            if rank != 7:
                 # check column (pawns on extremes can only capture in 1 direction)
-                if start[0] != 'a':
-                    left = chr(ord(start[0]) - 1) + str(int(start[1]) + 1)
-                    if self.board[left] == 'p' and self.pythonBoard.is_pinned(ch.BLACK, ch.parse_square(left)) == False:
+                if file != 0:
+                    left = start + 7
+                    if self.board[left] == 'p' and self.pythonBoard.is_pinned(ch.BLACK, left) == False:
                         return True
-                if start[0] != 'h':
-                    right = chr(ord(start[0]) + 1) + str(int(start[1]) + 1)
-                    if self.board[right] == 'p' and self.pythonBoard.is_pinned(ch.BLACK, ch.parse_square(right)) == False:
+                if file != 7:
+                    right = start + 9
+                    if self.board[right] == 'p' and self.pythonBoard.is_pinned(ch.BLACK, right) == False:
                         return True
                 return False
         else:
-            left = ""
-            right = ""
             # check row
-            if start[1] != '1':
+            if rank != 0:
                 # check column
-                if start[0] != 'a':
-                    right = chr(ord(start[0]) - 1) + str(int(start[1]) - 1)
-                    if self.board[right] == 'P' and self.pythonBoard.is_pinned(ch.WHITE, ch.parse_square(right)) == False:
+                if file != 0:
+                    right = start - 9
+                    if self.board[right] == 'P' and self.pythonBoard.is_pinned(ch.WHITE, right) == False:
                         return True
-                if start[0] != 'h':
-                    left = chr(ord(start[0]) + 1) + str(int(start[1]) - 1)
-                    if self.board[left] == 'P' and self.pythonBoard.is_pinned(ch.WHITE, ch.parse_square(left)) == False:
+                if file != 7:
+                    left = start - 7
+                    if self.board[left] == 'P' and self.pythonBoard.is_pinned(ch.WHITE, left) == False:
                         return True
                 return False
 
-    def orderMoves(self, moves: list[ch.Move]) -> list[list[str, float]]:
+    def orderMoves(self, moves: list[ch.Move], hashMove: ch.Move | None = None, ply: int | None = None) -> list[ch.Move]:
         """
-        orderMoves sorts the moves in an order with estimates to how good the
-        move is. There are 4 criterias: 
-        Move to capture a piece, 
-        Move to promote,
-        Move that gets a piece attacked by a pawn
-        Checkmate
+        orderMoves sorts the moves from the most to the least promising, so cutoffs come early.
+        The move stored for the position in the transposition table (hashMove) goes first, then
+        captures by MVV-LVA and promotions, then the killer moves of ply and the other quiet moves by
+        their history score. Moves to squares attacked by a pawn lose the value of the moving piece.
+        Only looks at the board mirror, no move is made.
         """
-        
-        valList = []
+        board = self.board
+        history = self.history
+        historyOffset = 0 if self.pythonBoard.turn == ch.WHITE else 4096
+        killers = self.killers[ply] if ply != None else (None, None)
+        scores = []
         for move in moves:
-            move = move.uci()
-            start = move[:2]
-            moveName = self.board[start]
-            moveColor = findColor(moveName)
-            movePiece = Piece(moveName, moveColor, 0, set())
-            if move[-1].isnumeric() == False:
-                move = move[2:-1]
-            else:
-                move = move[2:]
-            targetName = self.board[move]
-            # if there's a piece on the square, check the captured piece
+            if move == hashMove:
+                scores.append(HASH_MOVE_SCORE)
+                continue
+            start = move.from_square
+            target = move.to_square
+            moveName = board[start]
+            targetName = board[target]
+            # if there's a piece on the square, score the capture
             if targetName != '0':
-                targetColor = findColor(targetName)
-                targetPiece = Piece(targetName, targetColor, 0, set())
-                val = abs(targetPiece.value)
-                val = val - abs(movePiece.value)
+                val = MVV_LVA[PIECE_INDEX[moveName] * 12 + PIECE_INDEX[targetName]]
+            elif move.promotion:
+                val = CAPTURE_SCORE
+            elif move == killers[0]:
+                val = KILLER_SCORES[0]
+            elif move == killers[1]:
+                val = KILLER_SCORES[1]
             else:
-                val = 0
-            self.pythonBoard.push(ch.Move.from_uci(start + move))
-            if self.pythonBoard.is_checkmate():
-                val += 10000000
-            self.pythonBoard.pop()
-            # check for promotion
-            if (move[1] == '8' and moveName == 'P') or (move[1] == '1' or moveName == 'p'):
-                val += 90
+                val = history[historyOffset + start * 64 + target]
+            if move.promotion:
+                val += ORDER_VALUE[ch.piece_symbol(move.promotion).upper()] * 10
             # check for pawn attacks
-            if self.attackedByPawn(move, moveColor):
-                val -= movePiece.value
-            valList.append(val)
-        moves = list(moves)
-        combined = list(zip(moves, valList))
-        return combined
+            if self.attackedByPawn(target, "white" if moveName.isupper() else "black"):
+                val -= ORDER_VALUE[moveName.upper()] * 10
+            scores.append(val)
+        return [move for move, val in sorted(zip(moves, scores), key=lambda x: x[1], reverse=True)]
+
+    def storeCutoff(self, move: ch.Move, depth: int, ply: int, whiteTurn: bool) -> None:
+        """
+        storeCutoff remembers a quiet move that caused a beta cutoff at ply, as the first killer move
+        of the ply and in the history table, weighted by the depth left.
+        """
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        index = (0 if whiteTurn else 4096) + move.from_square * 64 + move.to_square
+        self.history[index] += depth * depth
+        if self.history[index] >= HISTORY_LIMIT:
+            ageHistory(self.history)
+
+    def hasPieces(self, isWhite: bool) -> bool:
+        """
+        hasPieces checks if the color isWhite has a piece other than its king and pawns.
+        """
+        if isWhite:
+            count = self.whitePieceCount
+            return count['N'] + count['B'] + count['R'] + count['Q'] > 0
+        count = self.blackPieceCount
+        return count['n'] + count['b'] + count['r'] + count['q'] > 0
 
     def endGameEval(self, endgameWeight: float, isWhite: bool) -> int:
         """
@@ -171,65 +255,47 @@ class Engine():
             return int(eval * endgameWeight)
         return 0
 
+    def scorePieces(self) -> float:
+        """
+        scorePieces adds up the material and map value of every piece on the board except the kings,
+        whose map depends on how many pieces are left. This is the full recompute of self.score.
+        """
+        score = 0
+        board = self.board
+        table = PIECE_SQUARE_TABLE
+        for square in range(64):
+            name = board[square]
+            # if there's a piece on the square
+            if name != '0' and name != 'K' and name != 'k':
+                score += table[PIECE_INDEX[name] * 64 + square]
+        return score
+
     def evaluate(self, isWhite: bool) -> float:
         """
         evaluate evaluates the position
         """
-        materialValue = 0
-        squares = list(self.board.keys())
-        if self.pythonBoard.is_stalemate():
+        # with no legal moves, the game is over by checkmate or stalemate
+        if not any(self.pythonBoard.generate_legal_moves()):
+            if self.pythonBoard.is_check():
+                return -MATE
             return 0
-        if self.pythonBoard.outcome() != None:
-            if self.pythonBoard.is_checkmate():
-                return -9999999
 
-        for square in squares:
-            # if there's a piece on the square
-            if self.board[square] != '0':
-                name = self.board[square]
-                color = findColor(name)
-                moves = set()
-                piece = Piece(name, color, 0, moves)
-                if color == 'black':
-                    if name == 'p':
-                        vMap = pawnMap(square)
-                    elif name == 'n':
-                        vMap = knightMap(square)
-                    elif name == 'b':
-                        vMap = bishopMap(square)
-                    elif name == 'q':
-                        vMap = queenMap(square)
-                    elif name == 'k':
-                        if ((self.whitePieceCount['Q'] == 0 and self.whitePieceCount['R'] <= 1 and self.whitePieceCount['B'] + self.whitePieceCount['N'] <= 2) or
-                            (self.whitePieceCount['B'] + self.whitePieceCount['N'] + self.whitePieceCount['R'] <= 2 and self.whitePieceCount['R'] <= 1)):
-                            vMap = lateKingMap(square)
-                        else:
-                            vMap = earlyKingMap(square)
-                    else:
-                        vMap = rookMap(square)
-                    materialValue += vMap.mapValue()
-                if color == 'white':
-                    row = int(square[1])
-                    newRow = str(9 - row)
-                    square = square[0] + newRow
-                    if name == 'P':
-                        vMap = pawnMap(square)
-                    elif name == 'N':
-                        vMap = knightMap(square)
-                    elif name == 'B':
-                        vMap = bishopMap(square)
-                    elif name == 'Q':
-                        vMap = queenMap(square)
-                    elif name == 'K':
-                        if ((self.blackPieceCount['q'] == 0 and self.blackPieceCount['r'] <= 1 and self.blackPieceCount['b'] + self.blackPieceCount['n'] <= 2) or
-                            (self.blackPieceCount['b'] + self.blackPieceCount['n'] + self.blackPieceCount['r'] <= 2 and self.blackPieceCount['r'] <= 1)):
-                            vMap = lateKingMap(square)
-                        else:
-                            vMap = earlyKingMap(square)
-                    else:
-                        vMap = rookMap(square)
-                    materialValue += -vMap.mapValue()
-                materialValue += piece.value * 10
+        # the king maps switch to the late game once the enemy is low on pieces
+        if isLateGame(self.blackPieceCount, False):
+            whiteKingIndex = LATE_KING_INDEX['K']
+        else:
+            whiteKingIndex = PIECE_INDEX['K']
+        if isLateGame(self.whitePieceCount, True):
+            blackKingIndex = LATE_KING_INDEX['k']
+        else:
+            blackKingIndex = PIECE_INDEX['k']
+        table = PIECE_SQUARE_TABLE
+        materialValue = (self.score + table[whiteKingIndex * 64 + self.pythonBoard.king(ch.WHITE)]
+                         + table[blackKingIndex * 64 + self.pythonBoard.king(ch.BLACK)])
+        if DEBUG_EVAL:
+            assert self.board == boardArray(self.pythonBoard), (self.pythonBoard.fen(), self.board)
+            assert abs(self.score - self.scorePieces()) < 1e-6, (self.pythonBoard.fen(), self.score, self.scorePieces())
+            assert self.zobristKey() == zobristHash(self.pythonBoard), self.pythonBoard.fen()
         if isWhite:
             # materialValue += self.endGameEval(self.blackPieces, isWhite)
             return materialValue
@@ -237,7 +303,7 @@ class Engine():
             # materialValue -= self.endGameEval(self.whitePieces, isWhite)
             return -materialValue
 
-    def isCapture(self, square: str) -> bool:
+    def isCapture(self, square: int) -> bool:
         if self.board[square] != '0':
             return True
         else:
@@ -245,78 +311,160 @@ class Engine():
 
     def findCaptureMoves(self, allMoves: list[ch.Move]) -> list[ch.Move]:
         """
-        Finds all capture moves of the piece at currPos which is a string representing 
-        a square on the board, such as a8 using allMoves which is a list containing 
+        Finds all capture moves in allMoves which is a list containing 
         every legal move of every piece
         """
         legalMoves = []
         for location in allMoves:
-            if location.uci()[-1].isnumeric() == False:
-                pos = location.uci()[2:-1]
-            else:
-                pos = location.uci()[2:]
-
-            if self.board[pos] != '0':
+            if self.board[location.to_square] != '0':
                 legalMoves.append(location)
         return legalMoves
 
-    def undoPieces(self, piece: str, ppiece: str, move: str, isWhite: bool) -> None:
+    def makeMove(self, move: ch.Move) -> None:
+        """
+        makeMove pushes move on pythonBoard and applies the same change to the board mirror, the score, the hash
+        and the piece counts.
+        Captures, promotions, castling and en passant are handled, and what is needed to
+        take the move back is kept on undoStack for unmakeMove.
+        """
+        board = self.board
+        table = PIECE_SQUARE_TABLE
+        score = self.score
+        pieceHash = self.pieceHash
+        start = move.from_square
+        target = move.to_square
+        piece = board[start]
+        captureSquare = target
+        # en passant is the only capture where the captured pawn isn't on the target square
+        if (piece == 'P' or piece == 'p') and target == self.pythonBoard.ep_square and board[target] == '0':
+            captureSquare = target - 8 if piece == 'P' else target + 8
+        captured = board[captureSquare]
+        rookStart = rookTarget = None
+        # castling, the king moves 2 squares and the rook jumps over it
+        if (piece == 'K' or piece == 'k') and abs(target - start) == 2:
+            if target > start:
+                rookStart, rookTarget = start + 3, start + 1
+            else:
+                rookStart, rookTarget = start - 4, start - 1
+            rook = board[rookStart]
+            board[rookTarget] = rook
+            board[rookStart] = '0'
+            self.score += table[PIECE_INDEX[rook] * 64 + rookTarget] - table[PIECE_INDEX[rook] * 64 + rookStart]
+            self.pieceHash ^= ZOBRIST_PIECES[rook][rookStart] ^ ZOBRIST_PIECES[rook][rookTarget]
+        board[captureSquare] = '0'
+        board[start] = '0'
+        if move.promotion:
+            promoted = ch.piece_symbol(move.promotion)
+            board[target] = promoted.upper() if piece == 'P' else promoted
+        else:
+            board[target] = piece
+        # the kings aren't part of the score, their map is only chosen in evaluate
+        if captured != '0':
+            self.score -= table[PIECE_INDEX[captured] * 64 + captureSquare]
+            self.pieceHash ^= ZOBRIST_PIECES[captured][captureSquare]
+        if piece != 'K' and piece != 'k':
+            self.score += table[PIECE_INDEX[board[target]] * 64 + target] - table[PIECE_INDEX[piece] * 64 + start]
+        self.pieceHash ^= ZOBRIST_PIECES[piece][start] ^ ZOBRIST_PIECES[board[target]][target]
+        self.undoStack.append((start, target, piece, captureSquare, captured, rookStart, rookTarget, score, pieceHash))
+        self.doPieces(piece, captured, board[target], piece.isupper())
+        self.pythonBoard.push(move)
+
+    def makeNullMove(self) -> None:
+        """
+        makeNullMove passes the turn without moving. Nothing but the turn and en passant square
+        change, and an empty entry is kept on undoStack so unmakeMove takes it back like any other move.
+        """
+        self.undoStack.append(None)
+        self.pythonBoard.push(ch.Move.null())
+
+    def unmakeMove(self) -> ch.Move:
+        """
+        unmakeMove takes back the last move made with makeMove (or makeNullMove) on pythonBoard and everything
+        makeMove updated.
+        """
+        board = self.board
+        entry = self.undoStack.pop()
+        if entry == None:
+            return self.pythonBoard.pop()
+        start, target, piece, captureSquare, captured, rookStart, rookTarget, score, pieceHash = entry
+        self.undoPieces(piece, captured, board[target], piece.isupper())
+        self.score = score
+        self.pieceHash = pieceHash
+        board[target] = '0'
+        board[captureSquare] = captured
+        board[start] = piece
+        if rookStart != None:
+            board[rookStart] = board[rookTarget]
+            board[rookTarget] = '0'
+        return self.pythonBoard.pop()
+
+    def zobristKey(self) -> int:
+        """
+        zobristKey gives the zobrist hash of the current position, used as its key in the transposition table.
+        """
+        pythonBoard = self.pythonBoard
+        return (self.pieceHash ^ HASHER.hash_castling(pythonBoard) ^ HASHER.hash_ep_square(pythonBoard)
+                ^ HASHER.hash_turn(pythonBoard))
+
+    def undoPieces(self, piece: str, ppiece: str, promoted: str, isWhite: bool) -> None:
+        """
+        undoPieces takes back the changes doPieces made to the piece counts.
+        """
         if ppiece != '0' and ppiece != 'k' and ppiece != 'K':
             if isWhite:
                 self.blackPieceCount[ppiece] += 1
             else:
                 self.whitePieceCount[ppiece] += 1
-        if isWhite:
-            if piece == 'P' and int(move[-1]) == 8:
-                self.whitePieceCount[piece] += 1
-                self.whitePieceCount['Q'] -= 1
-        else:
-            if piece == 'p' and int(move[-1]) == 1:
-                self.blackPieceCount[piece] -= 1
-                self.blackPieceCount['q'] += 1
+        if promoted != piece:
+            count = self.whitePieceCount if isWhite else self.blackPieceCount
+            count[piece] += 1
+            count[promoted] -= 1
 
-    def doPieces(self, piece: str, ppiece: str, move: str, isWhite: bool) -> None:
+    def doPieces(self, piece: str, ppiece: str, promoted: str, isWhite: bool) -> None:
+        """
+        doPieces updates the piece counts after piece took ppiece ('0' for no capture) and became promoted,
+        which is piece itself unless the move is a promotion.
+        """
         if ppiece != '0' and ppiece != 'k' and ppiece != 'K':
             if isWhite:
                 self.blackPieceCount[ppiece] -= 1
             else:
                 self.whitePieceCount[ppiece] -= 1
-        if isWhite:
-            if piece == 'P' and int(move[-1]) == 8:
-                self.whitePieceCount[piece] -= 1
-                self.whitePieceCount['Q'] += 1
-        else:
-            if piece == 'p' and int(move[-1]) == 1:
-                self.blackPieceCount[piece] -= 1
-                self.blackPieceCount['q'] += 1
+        if promoted != piece:
+            count = self.whitePieceCount if isWhite else self.blackPieceCount
+            count[piece] -= 1
+            count[promoted] += 1
+    def checkTime(self) -> None:
+        """
+        checkTime counts a node and stops the search with SearchTimeout once the deadline has passed
+        or stopEvent is set. They're only checked every 64 nodes.
+        """
+        self.nodes += 1
+        if self.nodes & 63 == 0:
+            if ((self.deadline != None and time.perf_counter() >= self.deadline) or
+                    (self.stopEvent != None and self.stopEvent.is_set())):
+                raise SearchTimeout
+
     def searchCaptures(self, whiteTurn: bool, alpha: int, beta: int) -> float:
         """
         Search captures looks at sequences of immediate captures to ensure that
         the score given to the position is accurate even after the depth has ran out.
         It inherits alpha and beta from the search function as well as whiteTurn.
         """
+        self.checkTime()
+        if self.stats != None:
+            self.stats.qnodes += 1
         evaluation = self.evaluate(whiteTurn)
         # don't need to check moves
         if evaluation >= beta:
             return beta
         alpha = max(alpha, evaluation)
         moves = self.orderMoves(self.findCaptureMoves(list(self.pythonBoard.legal_moves)))
-        moves = [move[0] for move in sorted(moves, key=lambda x: x[1], reverse=True)]
         # print("MOVES", moves)
         for move in moves:
-            self.pythonBoard.push(move)
-            if move.uci()[-1].isnumeric() == False:
-                moveName = move.uci()[2:-1]
-            else:
-                moveName = move.uci()[2:]
-            piece = self.board[move.uci()[:2]]
-            ppiece = self.board[moveName]
-            self.doPieces(piece, ppiece, moveName, whiteTurn)
-            self.board = fenConverter(self.pythonBoard.board_fen())
+            self.makeMove(move)
             evaluation = -self.searchCaptures(not whiteTurn, -beta, -alpha)
-            self.pythonBoard.pop()
-            self.undoPieces(piece, ppiece, moveName, whiteTurn)
-            self.board = fenConverter(self.pythonBoard.board_fen())
+            self.unmakeMove()
             if evaluation >= beta:
                 return beta
             alpha = max(alpha, evaluation)
@@ -327,96 +475,235 @@ class Engine():
         search function will give scores to position after searching with a
         depth of depth.
         """
-        squares = list(self.board.keys())
         # end of depth
-        if depth == 0 and baseDepth == DEPTH:
+        if depth == 0 and baseDepth >= DEPTH:
             return self.searchCaptures(whiteTurn, alpha, beta)
         elif depth == 0:
             return self.evaluate(whiteTurn)
+        self.checkTime()
+        stats = self.stats
 
-        moves = []
-        # finding legal moves this turn
-        if whiteTurn:
-            moves = self.orderMoves(list(self.pythonBoard.legal_moves))
-            moves = [move[0] for move in sorted(moves, key=lambda x: x[1], reverse=True)]
+        # if we find a position we've already visited at higher or equal depth, no need to re-evaluate,
+        # as long as the stored value isn't a bound on the wrong side of the window
+        key = self.zobristKey()
+        entry = self.transpositions.probe(key)
+        if stats != None:
+            stats.nodes += 1
+            stats.ttProbes += 1
+            if entry != None:
+                stats.ttHits += 1
+        if entry != None and depth - numExtensions != baseDepth:
+            value, entryDepth, flag, entryMove = entry
+            if entryDepth >= depth and (flag == EXACT or (flag == LOWER and value >= beta) or (flag == UPPER and value <= alpha)):
+                if stats != None:
+                    stats.ttCutoffs += 1
+                return min(max(value, alpha), beta)
+        alphaStart = alpha
+        bestMove = None
+        hashMove = entry[3] if entry != None else None
+        ply = len(self.undoStack) - self.rootPly
+        isRoot = depth - numExtensions == baseDepth
+        inCheck = self.pythonBoard.is_check()
 
-        else:
-            # organize the moves based on the past search at lower depth
-            if baseDepth != 1 and depth - numExtensions == baseDepth:
-                squareMoves = list(zip(self.prevDepthScores.keys(), self.prevDepthScores.values()))
-                moves = [ch.Move.from_uci(move[0]) for move in sorted(squareMoves, key=lambda x: x[1])]
-            else:
-                moves = self.orderMoves(list(self.pythonBoard.legal_moves))
-                moves = [move[0] for move in sorted(moves, key=lambda x: x[1], reverse=True)]
+        # null move pruning: if passing the turn still scores above beta at a lower depth, a real move would too.
+        # Not in check, not twice in a row, and not with only pawns left, where passing can be better than any move (zugzwang)
+        if (self.useNullMove and not isRoot and not inCheck and depth >= NULL_MOVE_MIN_DEPTH and beta != float("inf")
+                and self.undoStack and self.undoStack[-1] != None and self.hasPieces(whiteTurn)):
+            self.makeNullMove()
+            evaluation = -self.search(max(depth - 1 - NULL_MOVE_REDUCTION, 0), not whiteTurn, -beta, -beta + 1, baseDepth,
+                                      numExtensions)
+            self.unmakeMove()
+            if evaluation >= beta:
+                return beta
+
+        # finding legal moves this turn. At the root the hash move is the best move of the last depth
+        moves = self.orderMoves(list(self.pythonBoard.legal_moves), hashMove, ply)
+        # no legal moves, the game is over by checkmate or stalemate
+        if not moves:
+            return -MATE if inCheck else 0
+        searched = 0
         for move in moves:
-            if self.pythonBoard.gives_check(move) and numExtensions < 2:
+            givesCheck = self.pythonBoard.gives_check(move)
+            if givesCheck and numExtensions < 2:
                 extensions = 1
             else:
                 extensions = 0
-            self.pythonBoard.push(move)
-            if move.uci()[-1].isnumeric() == False:
-                moveName = move.uci()[2:-1]
-            else:
-                moveName = move.uci()[2:]
-            piece = self.board[move.uci()[:2]]
-            ppiece = self.board[moveName]
-            self.doPieces(piece, ppiece, moveName, whiteTurn)
-
-            fenBoard = self.pythonBoard.board_fen()
-            self.board = fenConverter(fenBoard)
-            # if we find a position we've already visited at higher or equal depth, no need to re-evaluate
-            if self.transpositions[(fenBoard, whiteTurn)][0] != None and self.transpositions[(fenBoard, whiteTurn)][1] >= depth:
-                evaluation = self.transpositions[(fenBoard, whiteTurn)][0]
-                self.pythonBoard.pop()
-                self.undoPieces(piece, ppiece, moveName, whiteTurn)
-                self.board = fenConverter(self.pythonBoard.board_fen())
-
-                if evaluation == alpha and depth - numExtensions == baseDepth:
-                    self.prevDepthScores[move.uci()] = 0
-                    continue
+            # late move reductions: quiet moves ordered late are unlikely to be best, they're first searched
+            # with a null window at a lower depth, and only searched fully if they beat alpha there
+            reduce = (self.useLmr and searched >= LMR_MOVES and depth >= LMR_MIN_DEPTH and not isRoot and not inCheck
+                      and not givesCheck and alpha != float("-inf") and self.board[move.to_square] == '0'
+                      and not move.promotion and move not in self.killers[ply])
+            self.makeMove(move)
 
-                # adding moves for our moves this depth
-                elif depth - numExtensions == baseDepth:
-                    self.prevDepthScores[move.uci()] = evaluation
+            evaluation = None
+            if reduce:
+                evaluation = -self.search(depth - 1 - LMR_REDUCTION, not whiteTurn, -alpha - 1, -alpha, baseDepth,
+                                          numExtensions)
+            # a reduced move that beats alpha is searched again at full depth
+            if evaluation == None or evaluation > alpha:
+                # principal variation search: past the first move, a null window only checks if the move beats alpha,
+                # and the moves that do are searched again with the full window
+                if self.usePvs and searched > 0 and alpha != float("-inf"):
+                    evaluation = -self.search(depth - 1 + extensions, not whiteTurn, -alpha - 1, -alpha, baseDepth,
+                                              numExtensions + extensions)
+                    if alpha < evaluation < beta:
+                        evaluation = -self.search(depth - 1 + extensions, not whiteTurn, -beta, -alpha, baseDepth,
+                                                  numExtensions + extensions)
+                else:
+                    evaluation = -self.search(depth - 1 + extensions, not whiteTurn, -beta, -alpha, baseDepth,
+                                              numExtensions + extensions)
 
-                # Choose the move. Only legal moves for the next turn will be at depth baseDepth
-                if depth - numExtensions == baseDepth:
-                    self.moves[evaluation] = move
-
-                # pruning
-                if evaluation >= beta:
-                    return beta
-                alpha = max(alpha, evaluation)
-                if depth - numExtensions == baseDepth:
-                    self.materialValue = alpha
-                continue
-
-            evaluation = -self.search(depth - 1 + extensions, not whiteTurn, -beta, -alpha, baseDepth, numExtensions + extensions) 
-            self.transpositions[(fenBoard, whiteTurn)] = [evaluation, depth]
-
-            self.pythonBoard.pop()
-            self.undoPieces(piece, ppiece, moveName, whiteTurn)
-            self.board = fenConverter(self.pythonBoard.board_fen())
-
-            if evaluation == alpha and depth - numExtensions == baseDepth:
-                self.prevDepthScores[move.uci()] = 0
-                continue
-
-            # adding moves for our moves this depth
-            elif depth - numExtensions == baseDepth:
-                self.prevDepthScores[move.uci()] = evaluation
+            self.unmakeMove()
+            searched += 1
 
             # Choose the move. Only legal moves for the next turn will be at depth baseDepth
             if depth - numExtensions == baseDepth:
+                if evaluation == alpha:
+                    continue
                 self.moves[evaluation] = move
 
             # pruning
             if evaluation >= beta:
+                # keep the score of a root move that fails high, think plays it once the window is fully open
+                if depth - numExtensions == baseDepth:
+                    self.materialValue = evaluation
+                if self.board[move.to_square] == '0' and not move.promotion:
+                    self.storeCutoff(move, depth, ply, whiteTurn)
+                if stats != None:
+                    stats.betaCutoffs += 1
+                    if searched == 1:
+                        stats.firstMoveCutoffs += 1
+                self.transpositions.store(key, depth, beta, LOWER, move)
                 return beta
-            alpha = max(alpha, evaluation)
+            if evaluation > alpha:
+                alpha = evaluation
+                bestMove = move
             if depth - numExtensions == baseDepth:
                 self.materialValue = alpha
         if depth - numExtensions == baseDepth:
-            print(self.moves, alpha)
+            if self.verbose:
+                print(self.moves, alpha)
             self.materialValue = alpha
+        self.transpositions.store(key, depth, alpha, EXACT if alpha > alphaStart else UPPER, bestMove)
         return alpha
+
+    def think(self, maxDepth: int, moveTime: float | None = None, startDepth: int = 1) -> ch.Move | None:
+        """
+        think runs an iterative deepening search from startDepth to maxDepth for the side to move. With a
+        moveTime in seconds, the search is stopped when the time is up (or stopEvent is set) and the best
+        move of the last completed depth is returned. The depth and score it came from are kept in completedDepth and bestScore.
+        With useAspiration, each depth is first searched with a window of ASPIRATION_WINDOW around the score
+        of the last depth, widened and searched again when the score falls outside of it.
+        """
+        whiteTurn = self.pythonBoard.turn == ch.WHITE
+        rootMoves = len(self.undoStack)
+        self.rootPly = rootMoves
+        # the search reaches up to maxDepth plies, and check extensions add up to 2 more
+        while len(self.killers) < maxDepth + 4:
+            self.killers.append([None, None])
+        self.deadline = time.perf_counter() + moveTime if moveTime != None else None
+        bestMove = None
+        self.bestScore = None
+        self.completedDepth = 0
+        for depth in range(startDepth, maxDepth + 1):
+            alpha = float("-inf")
+            beta = float("inf")
+            window = ASPIRATION_WINDOW
+            # no window around a checkmate
+            if self.useAspiration and self.bestScore != None and abs(self.bestScore) < MATE:
+                alpha = self.bestScore - window
+                beta = self.bestScore + window
+            try:
+                while True:
+                    self.moves = {}
+                    self.materialValue = None
+                    value = self.search(depth, whiteTurn, alpha, beta, depth, 0)
+                    # the score is outside of the window, widen the side it failed on, and open it up
+                    # completely after a few tries
+                    if value <= alpha and alpha != float("-inf"):
+                        window *= 4
+                        alpha = self.bestScore - window if window <= ASPIRATION_WINDOW * 16 else float("-inf")
+                    elif value >= beta and beta != float("inf"):
+                        window *= 4
+                        beta = self.bestScore + window if window <= ASPIRATION_WINDOW * 16 else float("inf")
+                    else:
+                        break
+            except SearchTimeout:
+                # take back the moves of the unfinished search
+                while len(self.undoStack) > rootMoves:
+                    self.unmakeMove()
+                break
+            if self.materialValue != None:
+                # when every move is lost, none of them raised alpha and the last depth's move is kept
+                bestMove = self.moves.get(self.materialValue, bestMove)
+                self.bestScore = self.materialValue
+            self.completedDepth = depth
+            if self.stats != None:
+                self.stats.endIteration(depth)
+            if self.verbose:
+                print(depth, bestMove, self.materialValue)
+            if self.onIteration != None:
+                self.onIteration(depth, bestMove, self.bestScore)
+        # out of time before the first depth was done, any move is better than none
+        if bestMove == None and self.materialValue != None:
+            bestMove = self.moves.get(self.materialValue)
+            self.bestScore = self.materialValue
+        if bestMove == None:
+            bestMove = next(iter(self.pythonBoard.legal_moves), None)
+        self.deadline = None
+        return bestMove
+
+
+if __name__ == "__main__":
+    # self-check of the incremental state: replays the games of games.txt and random games (which under-promote
+    # far more often) with makeMove, takes every move back with unmakeMove, and compares the board mirror, score,
+    # hash and piece counts with a full recompute after each of them
+    import random
+    import sys
+
+    def checkPosition(engine: Engine) -> None:
+        pythonBoard = engine.pythonBoard
+        squares = fenConverter(pythonBoard.board_fen())
+        assert engine.board == boardArray(pythonBoard), pythonBoard.fen()
+        assert all(squares[ch.SQUARE_NAMES[square]] == engine.board[square] for square in range(64)), pythonBoard.fen()
+        assert abs(engine.score - engine.scorePieces()) < 1e-6, pythonBoard.fen()
+        assert engine.zobristKey() == zobristHash(pythonBoard), pythonBoard.fen()
+        assert (engine.whitePieceCount, engine.blackPieceCount) == countPieces(pythonBoard)[2:], pythonBoard.fen()
+
+    def replay(moves) -> int:
+        """
+        replay makes every move moves gives for the board, then takes them all back.
+        """
+        pythonBoard = ch.Board()
+        whitePieces, blackPieces, whitePieceCount, blackPieceCount = countPieces(pythonBoard)
+        engine = Engine(pythonBoard, whitePieces, blackPieces, None, whitePieceCount, blackPieceCount)
+        for move in moves(pythonBoard):
+            engine.makeMove(move)
+            checkPosition(engine)
+        made = len(engine.undoStack)
+        while engine.undoStack:
+            engine.unmakeMove()
+            checkPosition(engine)
+        assert pythonBoard == ch.Board()
+        return made
+
+    def recordedMoves(line: str):
+        def moves(pythonBoard: ch.Board):
+            for san in line.split():
+                try:
+                    yield pythonBoard.parse_san(san)
+                except ValueError:
+                    return
+        return moves
+
+    def randomMoves(pythonBoard: ch.Board):
+        while not pythonBoard.is_game_over() and pythonBoard.ply() < 300:
+            yield random.choice(list(pythonBoard.legal_moves))
+
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    random.seed(0)
+    with open('games.txt', 'r') as f:
+        positions = sum(replay(recordedMoves(line)) for line in f.readlines()[:games])
+    positions += sum(replay(randomMoves) for game in range(games))
+    print(f"{games} recorded and {games} random games, {positions} moves made and taken back, "
+          f"board, score, hash and piece counts match")
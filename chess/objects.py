@@ -1,66 +1,40 @@
 import os
 
+# numerical value of each piece, for example a queen would be worth 9 points. Black pieces count against
+# white, so their values are negative
+PIECE_VALUES = {
+    'P': 1, 'N': 3, 'B': 3.01, 'R': 5, 'Q': 9, 'K': 10000,
+    'p': -1, 'n': -3, 'b': -3.01, 'r': -5, 'q': -9, 'k': -10000,
+}
+# the name commonly called of each piece, which is also the name of its picture
+PIECE_NAMES = {
+    'p': 'black_pawn', 'n': 'black_knight', 'b': 'black_bishop', 'r': 'black_rook', 'q': 'black_queen', 'k': 'black_king',
+    'P': 'white_pawn', 'N': 'white_knight', 'B': 'white_bishop', 'R': 'white_rook', 'Q': 'white_queen', 'K': 'white_king',
+}
+# path to the picture of each piece in each size
+TEXTURE_PATHS = {(letter, size): os.path.join(f"assets/{size}px/{name}.png")
+                 for letter, name in PIECE_NAMES.items() for size in ("80", "128")}
+
 class Piece:
     """
     Class to keep track of pieces and important values associated with them
     """
+    __slots__ = ("letter", "name", "color", "moved", "value", "moves", "texture", "texture_rect")
+
     def __init__(self, name: str, color: str, value: int, moves: set, texture=None, texture_rect=None):
-        self.name = name
-        # if the piece is black, then we want to minimize its score, otherwise, we want to maximize it
-        if (self.name.islower()):
-            value_sign = -1
-        else:
-            value_sign = 1
-        # associate a numerical value with the piece, for exame a queen would be worth 9 points
-        if (self.name == 'p' or self.name == 'P'):
-            self.value = 1
-        elif (self.name == 'n' or self.name == 'N'):
-            self.value = 3
-        elif (self.name == 'b' or self.name == 'B'):
-            self.value = 3.01
-        elif (self.name == 'r' or self.name == 'R'):
-            self.value = 5
-        elif (self.name == 'q' or self.name == 'Q'):
-            self.value = 9
-        elif (self.name == 'k' or self.name == 'K'):
-            self.value = 10000
-        # give the piece the name commonly called
-        if (self.name == 'p'):
-            self.name = 'black_pawn'
-        if (self.name == 'P'):
-            self.name = 'white_pawn'
-        if (self.name == 'n'):
-            self.name = 'black_knight'
-        if (self.name == 'N'):
-            self.name = 'white_knight'
-        if (self.name == 'b'):
-            self.name = 'black_bishop'
-        if (self.name == 'B'):
-            self.name = 'white_bishop'
-        if (self.name == 'r'):
-            self.name = 'black_rook'
-        if (self.name == 'R'):
-            self.name = 'white_rook'
-        if (self.name == 'q'):
-            self.name = 'black_queen'
-        if (self.name == 'Q'):
-            self.name = 'white_queen'
-        if (self.name == 'k'):
-            self.name = 'black_king'
-        if (self.name == 'K'):
-            self.name = 'white_king'
+        self.letter = name  # fen letter of the piece, name is its full name
+        self.name = PIECE_NAMES[name]
         self.color = color
         self.moved = False
-        self.value = self.value * value_sign
+        self.value = PIECE_VALUES[name]
         self.moves = moves
-        self.texture = texture
-        self.set_texture('80')
+        self.texture = TEXTURE_PATHS[(name, "80")]
         self.texture_rect = texture_rect
 
-    def set_texture(self, size:str) -> None:
+    def set_texture(self, size: str) -> None:
         """
         Give the path name to the picture of the piece, so we can load it as an image
         """
-        self.texture = os.path.join(
-            f"assets/{size}px/{self.name}.png"
-        )
+        self.texture = TEXTURE_PATHS.get((self.letter, str(size)))
+        if self.texture == None:
+            self.texture = os.path.join(f"assets/{size}px/{self.name}.png")
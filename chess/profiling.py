@@ -0,0 +1,184 @@
+"""
+Opt-in profiling of a search. With PROFILE set in constants.py, every engine turn is profiled and the
+profile written to PROFILE_DIR:
+
+    "cprofile"  cProfile, a .pstats file (snakeviz, gprof2dot or python -m pstats can read it)
+    "sample"    a sampling profiler with a lot less overhead, a .folded file of collapsed stacks
+                (flamegraph.pl or speedscope turn it into a flamegraph)
+    "allocations"  tracemalloc, the memory blocks allocated and still alive at the end of the search and
+                the peak, by line, in a .tracemalloc snapshot (tracemalloc.Snapshot.load reads it)
+
+The first two print the functions that took the most time, and how long search, searchCaptures, evaluate,
+orderMoves, makeMove and unmakeMove took on their own. To profile a search without the window:
+
+    python profiling.py --mode sample --depth 5 "<fen>"
+"""
+import argparse
+import collections
+import contextlib
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+import chess as ch
+from constants import DEPTH, PROFILE_DIR
+
+# the parts of the search reported on their own
+HOT_FUNCTIONS = ("search", "searchCaptures", "evaluate", "orderMoves", "makeMove", "unmakeMove")
+
+
+class Sampler():
+    """
+    Sampler records the stack of the thread that started it every interval seconds, from a thread of its own.
+    """
+    def __init__(self, interval: float = 0.001) -> None:
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.threadId = None
+        self.stopEvent = threading.Event()
+        self.thread = None
+
+    def start(self) -> None:
+        self.threadId = threading.get_ident()
+        self.stopEvent.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopEvent.set()
+        self.thread.join()
+
+    def run(self) -> None:
+        while not self.stopEvent.wait(self.interval):
+            frame = sys._current_frames().get(self.threadId)
+            stack = []
+            while frame != None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def write(self, path: str) -> None:
+        """
+        write saves the samples as collapsed stacks, one "caller;...;callee count" line per stack.
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def report(self, top: int = 15) -> None:
+        """
+        report prints the functions the most samples were in, and the share of the samples
+        every function of HOT_FUNCTIONS was in (itself or the functions it called).
+        """
+        selfCounts = collections.Counter()
+        totalCounts = collections.Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            selfCounts[frames[-1]] += count
+            for name in set(frames):
+                totalCounts[name] += count
+        samples = max(self.samples, 1)
+        print(f"{self.samples} samples")
+        print("most samples in the function itself:")
+        for name, count in selfCounts.most_common(top):
+            print(f"  {count / samples:6.1%}  {name}")
+        print("search functions, with what they call:")
+        for function in HOT_FUNCTIONS:
+            count = totalCounts[f"engine.py:{function}"]
+            print(f"  {count / samples:6.1%}  {function}")
+
+
+def reportProfile(profile: pstats.Stats, top: int = 15) -> None:
+    """
+    reportProfile prints the functions with the most time spent in them, and the calls and time of
+    every function of HOT_FUNCTIONS.
+    """
+    profile.sort_stats(pstats.SortKey.TIME).print_stats(top)
+    print(f"{'function':<16}{'calls':>10}{'own time':>10}{'total':>10}")
+    for (path, line, function), (primitiveCalls, calls, ownTime, totalTime, callers) in profile.stats.items():
+        if os.path.basename(path) == "engine.py" and function in HOT_FUNCTIONS:
+            print(f"{function:<16}{calls:>10}{ownTime:>10.3f}{totalTime:>10.3f}")
+
+
+def reportAllocations(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, peak: int, top: int = 15) -> None:
+    """
+    reportAllocations prints the lines with the most memory blocks allocated between before and after
+    that are still alive, and the peak of traced memory.
+    """
+    differences = after.compare_to(before, "lineno")
+    print(f"{sum(difference.count_diff for difference in differences)} blocks allocated and still alive, "
+          f"{sum(difference.size_diff for difference in differences) / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB")
+    for difference in sorted(differences, key=lambda difference: difference.count_diff, reverse=True)[:top]:
+        frame = difference.traceback[0]
+        print(f"  {difference.count_diff:>8} blocks {difference.size_diff / 1024:>9.1f} KiB  "
+              f"{os.path.basename(frame.filename)}:{frame.lineno}")
+
+
+@contextlib.contextmanager
+def profiled(mode: str | None, directory: str = PROFILE_DIR, name: str = "search"):
+    """
+    profiled profiles the code run in the with block with mode ("cprofile", "sample" or "allocations"), writes the profile
+    to directory and prints a report. With mode None nothing is done.
+    """
+    if mode == None:
+        yield
+        return
+    if mode not in ("cprofile", "sample", "allocations"):
+        raise ValueError(f"unknown profiling mode {mode!r}, use 'cprofile', 'sample' or 'allocations'")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}")
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path + ".pstats")
+            reportProfile(pstats.Stats(profiler))
+            print("profile written to", path + ".pstats")
+    elif mode == "allocations":
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        try:
+            yield
+        finally:
+            after = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            after.dump(path + ".tracemalloc")
+            reportAllocations(before, after, peak)
+            print("snapshot written to", path + ".tracemalloc")
+    else:
+        sampler = Sampler()
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            sampler.write(path + ".folded")
+            sampler.report()
+            print("collapsed stacks written to", path + ".folded")
+
+
+if __name__ == "__main__":
+    from searcher import Searcher
+
+    parser = argparse.ArgumentParser(description="Profile one search")
+    parser.add_argument("fen", nargs="?", default=ch.STARTING_FEN, help="position to search")
+    parser.add_argument("--mode", choices=("cprofile", "sample", "allocations"), default="cprofile")
+    parser.add_argument("--depth", type=int, default=DEPTH, help="depth to search to")
+    parser.add_argument("--move-time", type=float, help="seconds to search for instead of a depth")
+    parser.add_argument("--output", default=PROFILE_DIR, help="directory to write the profile to")
+    args = parser.parse_args()
+    searcher = Searcher()
+    with profiled(args.mode, args.output):
+        result = searcher.search(args.fen, depth=None if args.move_time != None else args.depth, moveTime=args.move_time)
+    print(result)
@@ -0,0 +1,131 @@
+"""
+Headless interface to the engine: give it a position and limits, get back the best move, its score,
+the principal variation and search statistics. Nothing here needs pygame or a window.
+"""
+import threading
+import time
+import chess as ch
+from constants import DEPTH, MAX_DEPTH, STATS_PATH, TT_SIZE_MB
+from engine import Engine, ageHistory, allocateTime, countPieces
+from stats import SearchStats, writeRecord
+from transposition import TranspositionTable, zobristHash
+
+
+class SearchResult():
+    """
+    Result of one search. score is in the engine's units (10 per pawn) from the side to move's point of view.
+    stats holds the search statistics when the Searcher collects them.
+    """
+    def __init__(self, bestMove: ch.Move | None, score: float | None, pv: list[ch.Move], depth: int,
+                 nodes: int, elapsed: float, ttStats: str, stats: dict | None = None) -> None:
+        self.bestMove = bestMove
+        self.score = score
+        self.pv = pv
+        self.depth = depth
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.nps = int(nodes / elapsed) if elapsed > 0 else 0
+        self.ttStats = ttStats
+        self.stats = stats
+
+    def __repr__(self) -> str:
+        pv = " ".join(move.uci() for move in self.pv)
+        return (f"SearchResult(bestMove={self.bestMove}, score={self.score}, depth={self.depth}, "
+                f"nodes={self.nodes}, nps={self.nps}, pv={pv})")
+
+
+class Searcher():
+    """
+    Searcher keeps a transposition table and the history scores of quiet moves between searches,
+    so searching the positions of one game in order reuses what was found on earlier moves.
+    With collectStats, every search counts its statistics, and with statsPath they're also written there
+    as one JSON line per search.
+    """
+    def __init__(self, ttSizeMb: int = TT_SIZE_MB, transpositions: TranspositionTable | None = None,
+                 collectStats: bool = False, statsPath: str | None = STATS_PATH) -> None:
+        if transpositions == None:
+            transpositions = TranspositionTable(ttSizeMb)
+        self.transpositions = transpositions
+        self.history = [0] * 8192
+        self.collectStats = collectStats or statsPath != None
+        self.statsPath = statsPath
+        self.engine = None
+
+    def newGame(self) -> None:
+        """
+        newGame forgets everything learned from the previous game.
+        """
+        self.transpositions.clear()
+        self.history = [0] * 8192
+
+    def search(self, position: ch.Board | str, depth: int | None = None, moveTime: float | None = None,
+               remaining: float | None = None, increment: float = 0, movesToGo: int = 30, verbose: bool = False,
+               stopEvent: threading.Event | None = None, onIteration=None, startDepth: int = 1) -> SearchResult:
+        """
+        search finds the best move of position, a chess.Board (left unchanged) or a fen string. The search
+        goes to depth, or as deep as it can in moveTime seconds, or in the time allocated from remaining
+        seconds on the clock with increment, spread over movesToGo moves. With no limit given, it searches
+        to DEPTH. Setting stopEvent from another thread ends the search early, and onIteration is called
+        with a SearchResult after every completed depth. Iterative deepening starts at startDepth.
+        """
+        if isinstance(position, str):
+            pythonBoard = ch.Board(position)
+        else:
+            pythonBoard = position.copy()
+        if moveTime == None and remaining != None:
+            moveTime = allocateTime(remaining, increment, movesToGo)
+        if depth == None:
+            depth = MAX_DEPTH if moveTime != None else DEPTH
+
+        start = time.perf_counter()
+        self.transpositions.newSearch()
+        # history from earlier moves still helps, but less than what this search finds
+        ageHistory(self.history)
+        whitePieces, blackPieces, whitePieceCount, blackPieceCount = countPieces(pythonBoard)
+        self.engine = Engine(pythonBoard, whitePieces, blackPieces, self.transpositions,
+                             whitePieceCount, blackPieceCount)
+        self.engine.verbose = verbose
+        self.engine.stopEvent = stopEvent
+        self.engine.history = self.history
+        if self.collectStats:
+            self.engine.stats = SearchStats()
+        if onIteration != None:
+            def iterationResult(depth: int, bestMove: ch.Move | None, score: float | None) -> None:
+                onIteration(SearchResult(bestMove, score, self.principalVariation(pythonBoard, bestMove), depth,
+                                         self.engine.nodes, time.perf_counter() - start, ""))
+            self.engine.onIteration = iterationResult
+        bestMove = self.engine.think(depth, moveTime, startDepth)
+        elapsed = time.perf_counter() - start
+        ttStats = self.transpositions.stats()
+        stats = None
+        if self.engine.stats != None:
+            stats = self.engine.stats.record(fen=pythonBoard.fen(), move=bestMove.uci() if bestMove != None else None,
+                                             score=self.engine.bestScore, depth=self.engine.completedDepth)
+            if self.statsPath != None:
+                writeRecord(self.statsPath, stats)
+        return SearchResult(bestMove, self.engine.bestScore, self.principalVariation(pythonBoard, bestMove),
+                            self.engine.completedDepth, self.engine.nodes, elapsed, ttStats, stats)
+
+    def principalVariation(self, pythonBoard: ch.Board, bestMove: ch.Move | None) -> list[ch.Move]:
+        """
+        principalVariation follows the best moves stored in the transposition table from the position
+        after bestMove, stopping at a missing or illegal move or a repeated position.
+        """
+        if bestMove == None:
+            return []
+        pv = [bestMove]
+        pythonBoard = pythonBoard.copy(stack=False)
+        pythonBoard.push(bestMove)
+        key = zobristHash(pythonBoard)
+        seen = {key}
+        while len(pv) < MAX_DEPTH:
+            entry = self.transpositions.probe(key)
+            if entry == None or entry[3] == None or not pythonBoard.is_legal(entry[3]):
+                break
+            pv.append(entry[3])
+            pythonBoard.push(entry[3])
+            key = zobristHash(pythonBoard)
+            if key in seen:
+                break
+            seen.add(key)
+        return pv
@@ -0,0 +1,150 @@
+"""
+Lazy SMP: several worker processes search the same root position at once and share one transposition
+table in shared memory. Each worker finds positions the others can cut off on, and helpers search one
+depth deeper every other worker so they don't all follow the same path. The result of the deepest
+completed search is used.
+
+    python smp.py --bench 1 2 4 8
+
+measures the time to reach a fixed depth with each number of workers.
+"""
+import argparse
+import multiprocessing
+import time
+import traceback
+from multiprocessing import shared_memory
+import chess as ch
+from constants import DEPTH, MAX_DEPTH, TT_SIZE_MB
+from searcher import Searcher, SearchResult
+from transposition import TranspositionTable, tableBytes
+
+
+def workerLoop(index: int, memoryName: str, ttSizeMb: int, tasks: multiprocessing.Queue,
+               results: multiprocessing.Queue, stopEvent) -> None:
+    """
+    workerLoop runs in each worker process, searching the positions sent on tasks until it gets None.
+    """
+    memory = shared_memory.SharedMemory(name=memoryName)
+    searcher = Searcher(transpositions=TranspositionTable(ttSizeMb, memory.buf))
+    try:
+        while True:
+            task = tasks.get()
+            if task == None:
+                break
+            fen, depth, moveTime = task
+            # half of the helpers search one depth deeper, and start there
+            extra = index % 2
+            try:
+                result = searcher.search(fen, depth=min(depth + extra, MAX_DEPTH), moveTime=moveTime,
+                                         stopEvent=stopEvent, startDepth=1 + extra)
+            except Exception:
+                # still answer with a legal move, so the main process isn't left waiting, and keep the worker
+                # for the next search. The depth of -1 lets any finished search win over it
+                traceback.print_exc()
+                result = SearchResult(next(iter(ch.Board(fen).legal_moves), None), None, [], -1, 0, 0, "")
+            bestMove = result.bestMove.uci() if result.bestMove != None else None
+            results.put((index, bestMove, result.score, result.depth, result.nodes))
+    finally:
+        searcher.transpositions.data.release()
+        memory.close()
+
+
+class ParallelSearcher():
+    """
+    Runs workers search processes sharing a transposition table of ttSizeMb megabytes. Close it
+    (or use it in a with block) to stop the processes and free the shared memory.
+    """
+    def __init__(self, workers: int, ttSizeMb: int = TT_SIZE_MB) -> None:
+        self.workers = workers
+        self.ttSizeMb = ttSizeMb
+        self.memory = shared_memory.SharedMemory(create=True, size=tableBytes(ttSizeMb))
+        self.transpositions = TranspositionTable(ttSizeMb, self.memory.buf)
+        self.transpositions.clear()
+        self.stopEvent = multiprocessing.Event()
+        self.results = multiprocessing.Queue()
+        self.tasks = []
+        self.processes = []
+        for index in range(workers):
+            tasks = multiprocessing.Queue()
+            process = multiprocessing.Process(target=workerLoop, daemon=True,
+                                              args=(index, self.memory.name, ttSizeMb, tasks, self.results, self.stopEvent))
+            process.start()
+            self.tasks.append(tasks)
+            self.processes.append(process)
+
+    def __enter__(self) -> "ParallelSearcher":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        close stops the workers and frees the shared memory. A worker that doesn't stop is terminated.
+        """
+        self.stopEvent.set()
+        for tasks in self.tasks:
+            tasks.put(None)
+        for process in self.processes:
+            if process.is_alive():
+                process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.transpositions.data.release()
+        self.memory.close()
+        self.memory.unlink()
+
+    def search(self, position: ch.Board | str, depth: int | None = None, moveTime: float | None = None) -> SearchResult:
+        """
+        search finds the best move of position with every worker, to depth or for moveTime seconds.
+        Once worker 0 is done the helpers are stopped, and the move of the deepest finished search is kept.
+        """
+        fen = position if isinstance(position, str) else position.fen()
+        if depth == None:
+            depth = MAX_DEPTH if moveTime != None else DEPTH
+        start = time.perf_counter()
+        self.stopEvent.clear()
+        for tasks in self.tasks:
+            tasks.put((fen, depth, moveTime))
+        finished = []
+        while not finished or finished[-1][0] != 0:
+            finished.append(self.results.get())
+        self.stopEvent.set()
+        while len(finished) < self.workers:
+            finished.append(self.results.get())
+        elapsed = time.perf_counter() - start
+
+        nodes = sum(result[4] for result in finished)
+        # deepest search wins, worker 0 breaks ties
+        index, bestMove, score, resultDepth, _ = max(finished, key=lambda result: (result[3], result[0] == 0))
+        pythonBoard = ch.Board(fen)
+        bestMove = ch.Move.from_uci(bestMove) if bestMove != None else None
+        searcher = Searcher(transpositions=self.transpositions)
+        return SearchResult(bestMove, score, searcher.principalVariation(pythonBoard, bestMove), resultDepth,
+                            nodes, elapsed, "")
+
+
+BENCH_POSITIONS = [
+    "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3",
+    "r3k2r/ppp2ppp/2n1bn2/3qp3/3P4/2N1BN2/PPP2PPP/R2QK2R b KQkq - 0 8",
+    "r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP3PPP/R2QKB1R w KQ - 0 8",
+    "8/5pk1/6p1/8/3R4/6P1/5PKP/r7 w - - 0 40",
+]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lazy SMP search")
+    parser.add_argument("--bench", type=int, nargs="+", default=[1, 2, 4], help="worker counts to time")
+    parser.add_argument("--depth", type=int, default=DEPTH, help="depth to search each position to")
+    args = parser.parse_args()
+    baseline = None
+    for workers in args.bench:
+        with ParallelSearcher(workers) as searcher:
+            total = 0
+            for fen in BENCH_POSITIONS:
+                searcher.transpositions.clear()
+                result = searcher.search(fen, depth=args.depth)
+                total += result.elapsed
+        if baseline == None:
+            baseline = total
+        print(f"{workers} workers: {total:.2f}s to depth {args.depth}, speedup {baseline / total:.2f}x")
@@ -0,0 +1,108 @@
+"""
+Search statistics. Give an Engine a SearchStats and search and searchCaptures count what they do in it;
+without one (the default) nothing is counted. Searcher writes one JSON line per move to STATS_PATH:
+
+    python stats.py stats.jsonl
+
+summarizes a file of them, to compare runs.
+"""
+import json
+import sys
+import time
+
+
+class SearchStats():
+    """
+    Counters of one search. nodes are the nodes of search, qnodes the nodes of searchCaptures.
+    """
+    def __init__(self) -> None:
+        self.nodes = 0
+        self.qnodes = 0
+        self.ttProbes = 0
+        self.ttHits = 0
+        self.ttCutoffs = 0
+        self.betaCutoffs = 0
+        self.firstMoveCutoffs = 0  # beta cutoffs on the first move searched, the better the ordering the more
+        self.iterations = []
+        self.start = time.perf_counter()
+        self.lastIteration = self.start
+        self.lastNodes = 0
+
+    def endIteration(self, depth: int) -> None:
+        """
+        endIteration keeps the time and node count of the depth that was just completed.
+        """
+        now = time.perf_counter()
+        totalNodes = self.nodes + self.qnodes
+        self.iterations.append({"depth": depth, "time": round(now - self.lastIteration, 4),
+                                "nodes": totalNodes - self.lastNodes})
+        self.lastIteration = now
+        self.lastNodes = totalNodes
+
+    def record(self, **fields) -> dict:
+        """
+        record gives the counters as a dictionary, along with fields.
+        """
+        elapsed = time.perf_counter() - self.start
+        totalNodes = self.nodes + self.qnodes
+        record = dict(fields)
+        record.update({
+            "nodes": self.nodes,
+            "qnodes": self.qnodes,
+            "nps": int(totalNodes / elapsed) if elapsed > 0 else 0,
+            "ttProbes": self.ttProbes,
+            "ttHits": self.ttHits,
+            "ttCutoffs": self.ttCutoffs,
+            "betaCutoffs": self.betaCutoffs,
+            "firstMoveCutoffRate": round(self.firstMoveCutoffs / self.betaCutoffs, 4) if self.betaCutoffs else None,
+            "time": round(elapsed, 4),
+            "iterations": self.iterations,
+        })
+        return record
+
+
+def writeRecord(path: str, record: dict) -> None:
+    """
+    writeRecord adds record to the end of the file at path as one line of JSON.
+    """
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def summarize(path: str) -> dict:
+    """
+    summarize adds up the records of a JSON lines file written by writeRecord.
+    """
+    moves = nodes = qnodes = ttProbes = ttHits = betaCutoffs = firstMoveCutoffs = 0
+    elapsed = 0.0
+    depths = 0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            moves += 1
+            nodes += record["nodes"]
+            qnodes += record["qnodes"]
+            ttProbes += record["ttProbes"]
+            ttHits += record["ttHits"]
+            betaCutoffs += record["betaCutoffs"]
+            if record["firstMoveCutoffRate"] != None:
+                firstMoveCutoffs += record["firstMoveCutoffRate"] * record["betaCutoffs"]
+            elapsed += record["time"]
+            depths += record.get("depth") or 0
+    return {
+        "moves": moves,
+        "nodes": nodes,
+        "qnodes": qnodes,
+        "nps": int((nodes + qnodes) / elapsed) if elapsed > 0 else 0,
+        "ttHitRate": round(ttHits / ttProbes, 4) if ttProbes else None,
+        "firstMoveCutoffRate": round(firstMoveCutoffs / betaCutoffs, 4) if betaCutoffs else None,
+        "averageDepth": round(depths / moves, 2) if moves else None,
+        "time": round(elapsed, 2),
+    }
+
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        print(path, json.dumps(summarize(path)))
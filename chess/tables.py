@@ -0,0 +1,152 @@
+"""
+Piece square tables built once at import from the maps in heatmaps.py. Every entry already holds the
+material value of the piece (times 10, like evaluate always used) plus its map value, with the sign of
+the piece's color and the rank mirroring for white baked in, so evaluating a piece is one list lookup.
+"""
+import chess as ch
+from objects import Piece, PIECE_VALUES
+from heatmaps import *
+
+# index of each piece in PIECE_SQUARE_TABLE, late game kings get their own tables
+PIECE_INDEX = {
+    'P': 0, 'N': 1, 'B': 2, 'R': 3, 'Q': 4, 'K': 5,
+    'p': 6, 'n': 7, 'b': 8, 'r': 9, 'q': 10, 'k': 11,
+}
+LATE_KING_INDEX = {'K': 12, 'k': 13}
+
+PIECE_MAPS = {
+    'p': pawnMap,
+    'n': knightMap,
+    'b': bishopMap,
+    'r': rookMap,
+    'q': queenMap,
+    'k': earlyKingMap,
+}
+
+
+def buildTable(name: str, vMapClass: type) -> list[float]:
+    """
+    buildTable gives the 64 values of the piece name indexed by python-chess square (a1 = 0, h8 = 63).
+    The maps give black's values, so white reads them from the mirrored rank with the opposite sign.
+    """
+    table = []
+    value = PIECE_VALUES[name] * 10
+    for square in range(64):
+        if name.islower():
+            table.append(vMapClass(ch.SQUARE_NAMES[square]).mapValue() + value)
+        else:
+            table.append(-vMapClass(ch.SQUARE_NAMES[ch.square_mirror(square)]).mapValue() + value)
+    return table
+
+
+def buildTables() -> list[float]:
+    """
+    buildTables lays out the table of every piece one after the other, so the value of a piece
+    is at PIECE_SQUARE_TABLE[index * 64 + square].
+    """
+    tables = [None] * 14
+    for name, index in PIECE_INDEX.items():
+        tables[index] = buildTable(name, PIECE_MAPS[name.lower()])
+    for name, index in LATE_KING_INDEX.items():
+        tables[index] = buildTable(name, lateKingMap)
+    return [value for table in tables for value in table]
+
+
+PIECE_SQUARE_TABLE = buildTables()
+
+# piece values move ordering counts with, a capturing king counts as a little more than a queen
+ORDER_VALUE = {'P': 1, 'N': 3, 'B': 3, 'R': 5, 'Q': 9, 'K': 10}
+# move ordering tiers, from first to last: the hash move, captures and promotions, the two killer moves,
+# then the other quiet moves by their history score, which is kept below HISTORY_LIMIT
+HASH_MOVE_SCORE = 1000000000
+CAPTURE_SCORE = 1000000
+KILLER_SCORES = (900000, 800000)
+HISTORY_LIMIT = 500000
+
+
+def buildMvvLva() -> list[int]:
+    """
+    buildMvvLva gives the ordering score of every capture, at MVV_LVA[attacker index * 12 + victim index].
+    The most valuable victim comes first and among captures of the same victim, the least valuable attacker.
+    """
+    table = [0] * 144
+    for attacker, attackerIndex in PIECE_INDEX.items():
+        for victim, victimIndex in PIECE_INDEX.items():
+            table[attackerIndex * 12 + victimIndex] = (CAPTURE_SCORE + ORDER_VALUE[victim.upper()] * 10
+                                                       - ORDER_VALUE[attacker.upper()])
+    return table
+
+
+MVV_LVA = buildMvvLva()
+
+
+def isLateGame(pieceCount: dict[str: int], isWhite: bool) -> bool:
+    """
+    isLateGame checks if the pieces left in pieceCount (the pieces of the color isWhite)
+    are few enough for the enemy king to use its late game map.
+    """
+    if isWhite:
+        queens, rooks, minors = pieceCount['Q'], pieceCount['R'], pieceCount['B'] + pieceCount['N']
+    else:
+        queens, rooks, minors = pieceCount['q'], pieceCount['r'], pieceCount['b'] + pieceCount['n']
+    return (queens == 0 and rooks <= 1 and minors <= 2) or (minors + rooks <= 2 and rooks <= 1)
+
+
+if __name__ == "__main__":
+    # micro-benchmark: scoring boards with the heatmap objects against scoring them with the tables
+    import time
+
+    def heatmapScore(board: list[str], whiteLate: bool, blackLate: bool) -> float:
+        score = 0
+        for square in range(64):
+            name = board[square]
+            if name == '0':
+                continue
+            vMapClass = PIECE_MAPS[name.lower()]
+            if name == 'k' and whiteLate or name == 'K' and blackLate:
+                vMapClass = lateKingMap
+            if name.islower():
+                score += vMapClass(ch.SQUARE_NAMES[square]).mapValue()
+            else:
+                score += -vMapClass(ch.SQUARE_NAMES[ch.square_mirror(square)]).mapValue()
+            score += Piece(name, "black" if name.islower() else "white", 0, set()).value * 10
+        return score
+
+    def tableScore(board: list[str], whiteLate: bool, blackLate: bool) -> float:
+        score = 0
+        table = PIECE_SQUARE_TABLE
+        for square in range(64):
+            name = board[square]
+            if name == '0':
+                continue
+            if name == 'K' and blackLate or name == 'k' and whiteLate:
+                score += table[LATE_KING_INDEX[name] * 64 + square]
+            else:
+                score += table[PIECE_INDEX[name] * 64 + square]
+        return score
+
+    boards = []
+    with open('games.txt', 'r') as f:
+        for line in f:
+            pythonBoard = ch.Board()
+            for san in line.split()[:60]:
+                try:
+                    pythonBoard.push_san(san)
+                except ValueError:
+                    break
+            board = ['0'] * 64
+            for square, piece in pythonBoard.piece_map().items():
+                board[square] = piece.symbol()
+            boards.append(board)
+            if len(boards) == 2000:
+                break
+
+    results = {}
+    for scoreFunction in (heatmapScore, tableScore):
+        start = time.perf_counter()
+        scores = [scoreFunction(board, whiteLate, blackLate) for board in boards
+                  for whiteLate in (False, True) for blackLate in (False, True)]
+        elapsed = time.perf_counter() - start
+        results[scoreFunction.__name__] = scores
+        print(f"{scoreFunction.__name__}: {len(scores) / elapsed:,.0f} evaluations/s")
+    assert all(abs(a - b) < 1e-9 for a, b in zip(results["heatmapScore"], results["tableScore"]))
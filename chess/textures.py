@@ -0,0 +1,32 @@
+"""
+Texture cache: every piece image of assets/80px and assets/128px is loaded from disk once and converted
+to the display's pixel format, instead of being loaded again each time it's drawn.
+"""
+import os
+import pygame
+from objects import PIECE_NAMES
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+TEXTURE_SIZES = ("80", "128")
+
+textures = {}  # (piece letter, size) -> surface
+
+
+def loadTextures() -> None:
+    """
+    loadTextures loads and converts the texture of every piece in every size. The display mode has to be
+    set first, convert_alpha needs to know its pixel format.
+    """
+    for size in TEXTURE_SIZES:
+        for letter, name in PIECE_NAMES.items():
+            path = os.path.join(ASSETS_DIR, f"{size}px", f"{name}.png")
+            textures[(letter, size)] = pygame.image.load(path).convert_alpha()
+
+
+def getTexture(letter: str, size: str = "80") -> pygame.Surface:
+    """
+    getTexture gives the texture of the piece with the fen letter letter, in size px.
+    """
+    if not textures:
+        loadTextures()
+    return textures[(letter, size)]
@@ -0,0 +1,175 @@
+"""
+Fixed size transposition table keyed by 64 bit zobrist hashes. The hashes use the polyglot random
+numbers from python-chess, so a key is the same as chess.polyglot.zobrist_hash gives for the position.
+"""
+import struct
+import chess as ch
+import chess.polyglot
+
+# kind of value stored in an entry
+EXACT = 0
+LOWER = 1  # the search failed high, the real value is at least the stored one
+UPPER = 2  # the search failed low, the real value is at most the stored one
+
+# key xor'ed with the check of the other fields, value (the bits of a double), move, depth, flag, age
+ENTRY = struct.Struct('<QQHbBBxxx')
+VALUE = struct.Struct('<d')
+VALUE_BITS = struct.Struct('<Q')
+BUCKET_SIZE = 2  # slot 0 keeps the deepest entry, slot 1 is always replaced
+
+RANDOM_ARRAY = chess.polyglot.POLYGLOT_RANDOM_ARRAY
+HASHER = chess.polyglot.ZobristHasher(RANDOM_ARRAY)
+
+# zobrist numbers of every piece on every square, indexed by the fen letter of the piece
+ZOBRIST_PIECES = {}
+for pieceType in ch.PIECE_TYPES:
+    for color in ch.COLORS:
+        kind = (pieceType - 1) * 2 + int(color)
+        ZOBRIST_PIECES[ch.Piece(pieceType, color).symbol()] = RANDOM_ARRAY[64 * kind:64 * kind + 64]
+
+
+def zobristHash(pythonBoard: ch.Board) -> int:
+    """
+    zobristHash gives the full zobrist hash of the position, the pieces, castling rights,
+    en passant file and side to move.
+    """
+    return HASHER(pythonBoard)
+
+
+def encodeMove(move: ch.Move) -> int:
+    """
+    encodeMove packs move in 16 bits: from square, to square and promotion piece. 0 means no move.
+    """
+    if move == None:
+        return 0
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+
+def tableBytes(sizeMb: int) -> int:
+    """
+    tableBytes gives the number of bytes the entries of a table of sizeMb megabytes take.
+    """
+    return max(1, sizeMb * 1024 * 1024 // (ENTRY.size * BUCKET_SIZE)) * BUCKET_SIZE * ENTRY.size
+
+
+def entryCheck(valueBits: int, move: int, depth: int, flag: int) -> int:
+    """
+    entryCheck folds the value, move, depth and flag of an entry into 64 bits. Entries keep their key
+    xor'ed with it, so an entry read while another process writes it, mixing the fields of two entries,
+    doesn't give back the key it's probed with.
+    """
+    return valueBits ^ move ^ ((depth & 0xFF) << 16) ^ (flag << 24)
+
+
+def decodeMove(code: int) -> ch.Move:
+    """
+    decodeMove turns a move packed by encodeMove back into a chess.Move, or None.
+    """
+    if code == 0:
+        return None
+    return ch.Move(code & 63, (code >> 6) & 63, (code >> 12) or None)
+
+
+class TranspositionTable():
+    """
+    Preallocated table of sizeMb megabytes with buckets of 2 entries. Each entry keeps the value
+    found for a position, the depth it was searched at, the kind of bound the value is and the best move.
+
+    The entries can live in a buffer given by the caller, such as the buffer of a
+    multiprocessing.shared_memory block that several search processes use at once. Writes aren't
+    locked, so a read racing a write can mix two entries. Each entry keeps its key xor'ed with the
+    check of its other fields (entryCheck), and a mixed entry doesn't match the key, so it's a miss.
+    """
+    def __init__(self, sizeMb: int, buffer: memoryview | None = None) -> None:
+        self.numBuckets = max(1, sizeMb * 1024 * 1024 // (ENTRY.size * BUCKET_SIZE))
+        self.capacity = self.numBuckets * BUCKET_SIZE
+        if buffer != None:
+            self.data = buffer[:self.capacity * ENTRY.size]
+        else:
+            self.data = bytearray(self.capacity * ENTRY.size)
+        self.age = 0
+        self.used = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def clear(self) -> None:
+        """
+        clear empties every entry of the table.
+        """
+        self.data[:] = bytes(len(self.data))
+        self.used = 0
+
+    def newSearch(self) -> None:
+        """
+        newSearch is called before each engine move. Entries from older searches
+        can be replaced in the depth preferred slot, and the statistics restart.
+        """
+        self.age = (self.age + 1) % 256
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def probe(self, key: int) -> tuple[float, int, int, ch.Move] | None:
+        """
+        probe looks for the position with the zobrist hash key. It returns
+        (value, depth, flag, best move) if the position is stored, None otherwise.
+        """
+        self.probes += 1
+        offset = (key % self.numBuckets) * BUCKET_SIZE * ENTRY.size
+        for slot in range(BUCKET_SIZE):
+            checkedKey, valueBits, move, depth, flag, age = ENTRY.unpack_from(self.data, offset + slot * ENTRY.size)
+            if checkedKey ^ entryCheck(valueBits, move, depth, flag) == key:
+                self.hits += 1
+                return VALUE.unpack(VALUE_BITS.pack(valueBits))[0], depth, flag, decodeMove(move)
+        return None
+
+    def store(self, key: int, depth: int, value: float, flag: int, move: ch.Move) -> None:
+        """
+        store saves the result of searching the position with the zobrist hash key. It goes in the
+        depth preferred slot if it's at least as deep as what's there (or what's there is old or the
+        same position), otherwise it goes in the always replace slot.
+        """
+        self.stores += 1
+        offset = (key % self.numBuckets) * BUCKET_SIZE * ENTRY.size
+        deepEntry = ENTRY.unpack_from(self.data, offset)
+        deepChecked, deepBits, deepMove, deepDepth, deepFlag, deepAge = deepEntry
+        deepKey = deepChecked ^ entryCheck(deepBits, deepMove, deepDepth, deepFlag)
+        if deepKey == 0 or deepKey == key or deepAge != self.age or depth >= deepDepth:
+            if deepKey == 0:
+                self.used += 1
+            elif deepKey != key:
+                # the entry pushed out of the deep slot still gets a chance in the other slot
+                self.replace(offset + ENTRY.size, deepEntry)
+        else:
+            offset += ENTRY.size
+            if self.isEmpty(offset):
+                self.used += 1
+        valueBits = VALUE_BITS.unpack(VALUE.pack(value))[0]
+        move = encodeMove(move)
+        ENTRY.pack_into(self.data, offset, key ^ entryCheck(valueBits, move, depth, flag), valueBits, move, depth, flag,
+                        self.age)
+
+    def isEmpty(self, offset: int) -> bool:
+        """
+        isEmpty checks if the entry at offset was never written.
+        """
+        checkedKey, valueBits, move, depth, flag, age = ENTRY.unpack_from(self.data, offset)
+        return checkedKey ^ entryCheck(valueBits, move, depth, flag) == 0
+
+    def replace(self, offset: int, entry: tuple) -> None:
+        """
+        replace copies entry, as unpacked from the table, to the always replace slot at offset.
+        """
+        if self.isEmpty(offset):
+            self.used += 1
+        ENTRY.pack_into(self.data, offset, *entry)
+
+    def stats(self) -> str:
+        """
+        stats gives the hit rate of this search's probes and how full the table is.
+        """
+        hitRate = self.hits / self.probes * 100 if self.probes else 0
+        fill = self.used / self.capacity * 100
+        return (f"tt: {self.probes} probes, {self.hits} hits ({hitRate:.1f}%), {self.stores} stores, "
+                f"{self.used}/{self.capacity} entries used ({fill:.1f}%)")
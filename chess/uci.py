@@ -0,0 +1,170 @@
+"""
+UCI front-end, so the engine can be run by tournament managers like cutechess-cli or fastchess:
+
+    cutechess-cli -engine cmd="python uci.py" dir=chess ...
+
+The search runs on a worker thread, so stop and isready are answered while it's thinking.
+"""
+import sys
+import threading
+import traceback
+import chess as ch
+from constants import DEPTH, MAX_DEPTH, TT_SIZE_MB
+from searcher import Searcher, SearchResult
+
+MATE_SCORE = 9000000  # scores past this are checkmates
+
+
+class UciEngine():
+    """
+    Reads UCI commands from stdin and answers on stdout.
+    """
+    def __init__(self) -> None:
+        self.searcher = Searcher(TT_SIZE_MB)
+        self.board = ch.Board()
+        self.worker = None
+        self.stopEvent = threading.Event()
+        self.outputLock = threading.Lock()
+
+    def send(self, line: str) -> None:
+        with self.outputLock:
+            sys.stdout.write(line + "\n")
+            sys.stdout.flush()
+
+    def loop(self) -> None:
+        """
+        loop handles commands until quit or the end of stdin.
+        """
+        for line in sys.stdin:
+            tokens = line.split()
+            if not tokens:
+                continue
+            command = tokens[0]
+            if command == "uci":
+                self.send("id name AI-Chess-bot")
+                self.send("id author deltag0")
+                self.send("uciok")
+            elif command == "isready":
+                self.send("readyok")
+            elif command == "ucinewgame":
+                self.stop()
+                self.searcher.newGame()
+                self.board = ch.Board()
+            elif command == "position":
+                self.stop()
+                self.position(tokens[1:])
+            elif command == "go":
+                self.stop()
+                self.go(tokens[1:])
+            elif command == "stop":
+                self.stop()
+            elif command == "quit":
+                break
+        self.stop()
+
+    def position(self, tokens: list[str]) -> None:
+        """
+        position sets up the board from "startpos" or "fen <fen>", followed by "moves <moves>".
+        """
+        if "moves" in tokens:
+            moves = tokens[tokens.index("moves") + 1:]
+            tokens = tokens[:tokens.index("moves")]
+        else:
+            moves = []
+        if tokens and tokens[0] == "fen":
+            self.board = ch.Board(" ".join(tokens[1:]))
+        else:
+            self.board = ch.Board()
+        for move in moves:
+            self.board.push_uci(move)
+
+    def go(self, tokens: list[str]) -> None:
+        """
+        go starts searching the current position on the worker thread with the limits in tokens
+        (depth, movetime, wtime, btime, winc, binc, movestogo, infinite). The depth is capped at MAX_DEPTH,
+        and limits that aren't numbers are ignored.
+        """
+        limits = {}
+        for name, value in zip(tokens, tokens[1:] + [""]):
+            if name in ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo"):
+                try:
+                    limits[name] = int(value)
+                except ValueError:
+                    self.send(f"info string ignoring {name} {value}".rstrip())
+        depth = limits.get("depth")
+        moveTime = None
+        remaining = None
+        increment = 0
+        # moves left until the clock gets more time, without it the clock is split over 30 moves
+        movesToGo = max(1, limits.get("movestogo", 30))
+        if "movetime" in limits:
+            moveTime = limits["movetime"] / 1000
+        elif ("wtime" if self.board.turn == ch.WHITE else "btime") in limits:
+            remaining = limits["wtime" if self.board.turn == ch.WHITE else "btime"] / 1000
+            increment = limits.get("winc" if self.board.turn == ch.WHITE else "binc", 0) / 1000
+        infinite = "infinite" in tokens
+        if infinite and depth == None:
+            depth = MAX_DEPTH
+        elif depth == None and moveTime == None and remaining == None:
+            depth = DEPTH
+        if depth != None:
+            depth = max(1, min(depth, MAX_DEPTH))
+
+        self.stopEvent.clear()
+        board = self.board.copy()
+        self.worker = threading.Thread(target=self.think, daemon=True,
+                                       args=(board, depth, moveTime, remaining, increment, movesToGo, infinite))
+        self.worker.start()
+
+    def think(self, board: ch.Board, depth: int | None, moveTime: float | None, remaining: float | None,
+              increment: float, movesToGo: int = 30, infinite: bool = False) -> None:
+        """
+        think searches board and always answers with a bestmove, even when the search fails. An infinite
+        search holds its bestmove until stop.
+        """
+        try:
+            result = self.searcher.search(board, depth=depth, moveTime=moveTime, remaining=remaining,
+                                          increment=increment, movesToGo=movesToGo, stopEvent=self.stopEvent,
+                                          onIteration=self.info)
+        except Exception:
+            # any legal move is better than losing on time
+            traceback.print_exc()
+            result = SearchResult(next(iter(board.legal_moves), None), None, [], 0, 0, 0, "")
+        if infinite:
+            self.stopEvent.wait()
+        if result.bestMove == None:
+            self.send("bestmove 0000")
+        elif len(result.pv) > 1:
+            self.send(f"bestmove {result.bestMove.uci()} ponder {result.pv[1].uci()}")
+        else:
+            self.send(f"bestmove {result.bestMove.uci()}")
+
+    def info(self, result: SearchResult) -> None:
+        """
+        info reports a completed depth.
+        """
+        if result.score == None:
+            score = "cp 0"
+        elif abs(result.score) >= MATE_SCORE:
+            # the side to move mates (or is mated) at the end of the principal variation
+            mateIn = (len(result.pv) + 1) // 2
+            score = f"mate {mateIn if result.score > 0 else -mateIn}"
+        else:
+            # the engine counts 10 per pawn
+            score = f"cp {int(round(result.score * 10))}"
+        pv = " ".join(move.uci() for move in result.pv)
+        self.send(f"info depth {result.depth} score {score} nodes {result.nodes} nps {result.nps} "
+                  f"time {int(result.elapsed * 1000)} pv {pv}")
+
+    def stop(self) -> None:
+        """
+        stop ends the running search, which still answers with its best move.
+        """
+        if self.worker != None:
+            self.stopEvent.set()
+            self.worker.join()
+            self.worker = None
+
+
+if __name__ == "__main__":
+    UciEngine().loop()
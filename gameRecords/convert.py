@@ -1,26 +1,238 @@
-def skipBad(line: str, start: int) -> int:
-    while (start < len(line) and line[start] != ' '):
-        if (line[start] == '.'):
-            return [True, start]
-        start += 1
-    return [False, start]
-
-with open('tst.txt', 'r') as f:
-    for line in f:
-        if line[0].isnumeric():
-            print(line)
-            goodLine = []
-            lineLen = len(line)
-            i = 0
-            while i < lineLen:
-                if (line[i + 1] == '-'):
-                    break
-                check = skipBad(line, i)
-                if check[0] == True:
-                    i = check[1] + 2
-                else:
-                    goodLine.append(line[i:check[1]])
-                    i = check[1] + 1
-            print(goodLine)
-            with open('more.txt', 'a') as f2:
-                f2.write(" ".join(goodLine) + '\n')
+import argparse
+import bz2
+import collections
+import concurrent.futures
+import gzip
+import io
+import lzma
+import os
+import re
+import sys
+import time
+# the book format lives with the engine
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'chess'))
+from book import compileBook
+from constants import BOOK_PLIES
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+COMMENT = re.compile(r"\{[^}]*\}|;[^\n]*")
+VARIATION = re.compile(r"\([^()]*\)")
+NOISE = re.compile(r"\$\d+|\d+\.(\.\.)?|[!?]+")
+HEADER = re.compile(r'\[(\w+)\s+"([^"]*)"\]')
+WRITE_BUFFER = 1024 * 1024
+# first bytes of each compressed format, to recognize compressed input on stdin
+MAGIC_NUMBERS = ((b"\x1f\x8b", ".gz"), (b"BZh", ".bz2"), (b"\xfd7zXZ", ".xz"), (b"\x28\xb5\x2f\xfd", ".zst"))
+
+
+def openInput(path: str) -> io.TextIOBase:
+    """
+    openInput opens path as text, decompressing .gz, .bz2, .xz and .zst files. A path of - is stdin,
+    whose format is told by its first bytes.
+    """
+    if path == "-":
+        source = sys.stdin.buffer
+        start = source.peek(8)
+        kind = next((extension for magic, extension in MAGIC_NUMBERS if start.startswith(magic)), None)
+    else:
+        source = open(path, "rb")
+        kind = os.path.splitext(path)[1]
+    if kind == ".gz":
+        return gzip.open(source, "rt", encoding="utf-8", errors="replace")
+    if kind == ".bz2":
+        return bz2.open(source, "rt", encoding="utf-8", errors="replace")
+    if kind == ".xz":
+        return lzma.open(source, "rt", encoding="utf-8", errors="replace")
+    if kind == ".zst":
+        try:
+            import zstandard
+        except ImportError:
+            raise SystemExit(f"reading {path} needs the zstandard package (pip install zstandard)")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(source), encoding="utf-8", errors="replace")
+    return io.TextIOWrapper(source, encoding="utf-8", errors="replace")
+
+
+def gameTexts(paths: list[str]):
+    """
+    gameTexts gives the raw text of every game in paths, headers included. Pgn games are split at
+    their headers. In files without headers, like games.txt, each line is a game.
+    """
+    for path in paths:
+        with openInput(path) as f:
+            lines = []
+            inMoves = False
+            for line in f:
+                if line.startswith('['):
+                    # the headers of the next game
+                    if inMoves:
+                        yield "".join(lines)
+                        lines = []
+                        inMoves = False
+                    lines.append(line)
+                elif line.strip():
+                    lines.append(line)
+                    inMoves = True
+                    if len(lines) == 1:
+                        yield line
+                        lines = []
+                        inMoves = False
+            if lines:
+                yield "".join(lines)
+
+
+def parseGame(text: str, filters: tuple) -> str | None:
+    """
+    parseGame turns the raw text of a game into one line of san moves, like games.txt, without
+    move numbers, comments, variations or annotations. Returns None if the game doesn't pass filters.
+    """
+    minRating, maxRating, timeControls, minBaseTime = filters
+    headers = dict(HEADER.findall(text))
+    if minRating != None or maxRating != None:
+        try:
+            ratings = (int(headers["WhiteElo"]), int(headers["BlackElo"]))
+        except (KeyError, ValueError):
+            return None
+        if minRating != None and min(ratings) < minRating:
+            return None
+        if maxRating != None and max(ratings) > maxRating:
+            return None
+    timeControl = headers.get("TimeControl")
+    if timeControls and timeControl not in timeControls:
+        return None
+    if minBaseTime != None:
+        try:
+            if int(timeControl.split('+')[0]) < minBaseTime:
+                return None
+        except (AttributeError, ValueError):
+            return None
+
+    moveText = COMMENT.sub(" ", HEADER.sub(" ", text))
+    # variations can hold variations, remove them from the inside out
+    previous = None
+    while previous != moveText:
+        previous = moveText
+        moveText = VARIATION.sub(" ", moveText)
+    moves = []
+    for token in NOISE.sub(" ", moveText).split():
+        if token in RESULTS:
+            break
+        moves.append(token)
+    if not moves:
+        return None
+    return " ".join(moves)
+
+
+def parseChunk(texts: list[str], filters: tuple) -> tuple[str, int]:
+    """
+    parseChunk parses a chunk of games in a worker process. It returns the output lines
+    of the games that passed the filters and how many games were read.
+    """
+    lines = []
+    for text in texts:
+        line = parseGame(text, filters)
+        if line != None:
+            lines.append(line + '\n')
+    return "".join(lines), len(texts)
+
+
+def chunked(iterable, size: int):
+    """
+    chunked groups the items of iterable in lists of size items.
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def parseGames(paths: list[str], filters: tuple, workers: int, chunkSize: int):
+    """
+    parseGames gives (output text, games read) for each chunk of games in paths, in order. With more
+    than one worker the chunks are parsed in a process pool, with only a few chunks in flight at a time
+    so the input is streamed instead of read all at once.
+    """
+    chunks = chunked(gameTexts(paths), chunkSize)
+    if workers <= 1:
+        for chunk in chunks:
+            yield parseChunk(chunk, filters)
+        return
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        pending = collections.deque()
+        for chunk in chunks:
+            pending.append(executor.submit(parseChunk, chunk, filters))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def ingest(paths: list[str], outputPath: str, filters: tuple, workers: int, chunkSize: int) -> None:
+    """
+    ingest writes every game of paths that passes filters to outputPath, one game per line like games.txt,
+    and reports the throughput on stderr.
+    """
+    start = time.perf_counter()
+    lastReport = start
+    read = 0
+    written = 0
+    if outputPath == "-":
+        output = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", write_through=False)
+    else:
+        output = open(outputPath, "w", encoding="utf-8", buffering=WRITE_BUFFER)
+    with output:
+        for text, games in parseGames(paths, filters, workers, chunkSize):
+            output.write(text)
+            read += games
+            written += text.count('\n')
+            now = time.perf_counter()
+            if now - lastReport >= 5:
+                print(f"{read} games read, {written} kept, {read / (now - start):,.0f} games/s", file=sys.stderr)
+                lastReport = now
+    elapsed = time.perf_counter() - start
+    print(f"{read} games read, {written} kept in {elapsed:.1f}s ({read / max(elapsed, 1e-9):,.0f} games/s)",
+          file=sys.stderr)
+
+
+def readGames(paths: list[str], filters: tuple):
+    """
+    readGames gives the san moves of every game of paths that passes filters.
+    """
+    for text in gameTexts(paths):
+        line = parseGame(text, filters)
+        if line != None:
+            yield line.split()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert game records")
+    filterParser = argparse.ArgumentParser(add_help=False)
+    filterParser.add_argument("--min-rating", type=int, help="skip games where a player is rated lower")
+    filterParser.add_argument("--max-rating", type=int, help="skip games where a player is rated higher")
+    filterParser.add_argument("--time-control", action="append",
+                              help="only keep games with this TimeControl header, like 180+2 (can be repeated)")
+    filterParser.add_argument("--min-base-time", type=int, help="skip games with less base time, in seconds")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingestParser = commands.add_parser("ingest", parents=[filterParser],
+                                       help="convert pgn games into one line of san moves per game")
+    ingestParser.add_argument("inputs", nargs="*", default=["-"],
+                              help="pgn files, optionally .gz/.bz2/.xz/.zst compressed (default: stdin)")
+    ingestParser.add_argument("-o", "--output", default="-", help="file to write the games to (default: stdout)")
+    ingestParser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="worker processes")
+    ingestParser.add_argument("--chunk-size", type=int, default=2000, help="games sent to a worker at a time")
+
+    bookParser = commands.add_parser("book", parents=[filterParser], help="compile games into a binary opening book")
+    bookParser.add_argument("games", nargs="+", help="pgn files or files with one game per line in san")
+    bookParser.add_argument("-o", "--output", required=True, help="path of the book file to write")
+    bookParser.add_argument("--plies", type=int, default=BOOK_PLIES, help="number of plies of each game kept")
+
+    args = parser.parse_args()
+    filters = (args.min_rating, args.max_rating, set(args.time_control or ()), args.min_base_time)
+    if args.command == "ingest":
+        ingest(args.inputs, args.output, filters, args.workers, args.chunk_size)
+    else:
+        records = compileBook(readGames(args.games, filters), args.output, args.plies)
+        print(f"wrote {records} records to {args.output}")